@@ -0,0 +1,340 @@
+"""Статистика расстановок и ходов компьютера на миллионах партий: аккумуляторы на NumPy.
+
+FleetStats считает, как часто каждая клетка занята кораблем - всего и по размерам кораблей, - и как часто
+заняты сразу обе клетки каждой пары. Расстановки берутся из FieldGenerator.generate_layout, из таблицы
+layout_table или из текстового файла в формате Field.parse_layout. ShotStats считает, каким по счету
+выстрелом стратегия бьет в каждую клетку и сколько выстрелов ей нужно, чтобы потопить весь флот.
+
+Расстановки и партии обрабатываются кусками по chunk штук, поэтому память ограничена размером куска
+и самих аккумуляторов. Процессы считают свои частичные аккумуляторы, а они складываются через merge.
+Результат сохраняется в .npz: тепловые карты - массивы size * size.
+
+Запуск:
+    python analytics.py fleets --count 1000000 --output fleets.npz
+    python analytics.py fleets --table layouts_6x6.bin --output table.npz
+    python analytics.py shots --games 100000 --strategy density --output density.npz
+
+Требует numpy.
+"""
+import argparse
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from layout_table import LayoutTable, layout_ships
+from layout_validator import validate_layout, parse_ship
+from models_inner import SIZE, FieldGenerator, SeaBattleException, default_fleet, game_seed, new_seed
+from models_outer import get_strategy
+
+
+CHUNK = 4096  # Расстановок или партий в одном куске
+TASK = 1 << 16  # Расстановок или партий в одной задаче для процесса
+MAX_PAIR_CELLS = 4096  # Больше клеток - матрица пар заняла бы больше 128 МБ, ее не считаем
+
+
+class FleetStats:
+    """Занятость клеток по расстановкам."""
+
+    def __init__(self, size=SIZE, fleet=None, pairs=None):
+        """
+        :param fleet: размеры кораблей; по умолчанию default_fleet(size)
+        :param pairs: считать ли совместную занятость пар клеток; по умолчанию - если клеток не больше MAX_PAIR_CELLS
+        """
+        self.size = size
+        self.fleet = tuple(fleet or default_fleet(size))
+        self.ship_sizes = tuple(sorted(set(self.fleet)))
+        cells = size * size
+        self.fleets = 0
+        self.occupancy = np.zeros(cells, dtype=np.int64)  # Сколько раз клетка занята кораблем
+        # Строка k - то же для кораблей размером ship_sizes[k]
+        self.size_occupancy = np.zeros((len(self.ship_sizes), cells), dtype=np.int64)
+        if pairs is None:
+            pairs = cells <= MAX_PAIR_CELLS
+        self.pairs = np.zeros((cells, cells), dtype=np.int64) if pairs else None  # Сколько раз заняты обе клетки
+
+    def add_chunk(self, ship_size_by_cell):
+        """Учесть кусок расстановок.
+        :param ship_size_by_cell: массив (расстановки, клетки): размер корабля в клетке, 0 - пусто
+        """
+        occupied = ship_size_by_cell > 0
+        self.fleets += len(ship_size_by_cell)
+        self.occupancy += occupied.sum(axis=0)
+        for k, ship_size in enumerate(self.ship_sizes):
+            self.size_occupancy[k] += (ship_size_by_cell == ship_size).sum(axis=0)
+        if self.pairs is not None:
+            # В float32 произведение точное, пока расстановок в куске меньше 2 ** 24
+            x = occupied.astype(np.float32)
+            self.pairs += (x.T @ x).astype(np.int64)
+
+    def add_layouts(self, layouts):
+        """Учесть расстановки: каждая - список кораблей, корабль - координаты палуб (x, y) с 1."""
+        size = self.size
+        rows, cols, values = [], [], []
+        count = 0
+        for k, ships in enumerate(layouts):
+            count += 1
+            for cells in ships:
+                for x, y in cells:
+                    rows.append(k)
+                    cols.append((x - 1) * size + y - 1)
+                    values.append(len(cells))
+        chunk = np.zeros((count, size * size), dtype=np.int8)
+        chunk[rows, cols] = values
+        self.add_chunk(chunk)
+
+    def merge(self, other):
+        if (self.size, self.ship_sizes) != (other.size, other.ship_sizes):
+            raise SeaBattleException("Статистика собрана для другого поля или флота.")
+        self.fleets += other.fleets
+        self.occupancy += other.occupancy
+        self.size_occupancy += other.size_occupancy
+        if self.pairs is not None and other.pairs is not None:
+            self.pairs += other.pairs
+        else:
+            self.pairs = None
+        return self
+
+    def heatmap(self):
+        """Доля расстановок, в которых клетка занята кораблем: массив size * size."""
+        return (self.occupancy / max(self.fleets, 1)).reshape(self.size, self.size)
+
+    def arrays(self):
+        """Массивы для сохранения: доли, а не счетчики, у тепловых карт - форма size * size."""
+        n = max(self.fleets, 1)
+        out = {
+            "size": np.array(self.size),
+            "fleets": np.array(self.fleets),
+            "ship_sizes": np.array(self.ship_sizes),
+            "occupancy": self.heatmap(),
+            "size_occupancy": (self.size_occupancy / n).reshape(-1, self.size, self.size),
+        }
+        if self.pairs is not None:
+            out["pairs"] = self.pairs / n
+        return out
+
+    def save(self, path):
+        np.savez_compressed(path, **self.arrays())
+
+    def __str__(self):
+        heat = self.heatmap()
+        return (
+            f"Расстановок: {self.fleets}"
+            f"\nДоля расстановок с кораблем в клетке: от {heat.min():.4f} до {heat.max():.4f}"
+            f" (в {heat.max() / heat.min() if heat.min() else float('inf'):.2f} раза)"
+        )
+
+
+class ShotStats:
+    """Порядок выстрелов стратегии по полям FieldGenerator."""
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        cells = size * size
+        self.games = 0
+        self.shot = np.zeros(cells, dtype=np.int64)  # Сколько раз по клетке стреляли
+        self.order_sum = np.zeros(cells, dtype=np.int64)  # Сумма номеров выстрелов по клетке, с 1
+        self.first_shot = np.zeros(cells, dtype=np.int64)  # Сколько раз партия началась с этой клетки
+        self.shots_to_win = np.zeros(cells + 1, dtype=np.int64)  # Партий, потопленных за k выстрелов
+
+    def add_chunk(self, order):
+        """Учесть кусок партий.
+        :param order: массив (партии, клетки): номер выстрела по клетке с 1, 0 - по клетке не стреляли
+        """
+        shot = order > 0
+        self.games += len(order)
+        self.shot += shot.sum(axis=0)
+        self.order_sum += order.sum(axis=0, dtype=np.int64)
+        self.first_shot += (order == 1).sum(axis=0)
+        self.shots_to_win += np.bincount(order.max(axis=1), minlength=len(self.shots_to_win))
+
+    def merge(self, other):
+        if self.size != other.size:
+            raise SeaBattleException("Статистика собрана для другого поля.")
+        self.games += other.games
+        self.shot += other.shot
+        self.order_sum += other.order_sum
+        self.first_shot += other.first_shot
+        self.shots_to_win += other.shots_to_win
+        return self
+
+    def arrays(self):
+        n = max(self.games, 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_order = np.where(self.shot > 0, self.order_sum / self.shot, np.nan)
+        return {
+            "size": np.array(self.size),
+            "games": np.array(self.games),
+            "shot": (self.shot / n).reshape(self.size, self.size),  # Доля партий, где по клетке стреляли
+            "mean_order": mean_order.reshape(self.size, self.size),
+            "first_shot": (self.first_shot / n).reshape(self.size, self.size),
+            "shots_to_win": self.shots_to_win,
+        }
+
+    def save(self, path):
+        np.savez_compressed(path, **self.arrays())
+
+    def __str__(self):
+        shots = np.arange(len(self.shots_to_win))
+        mean = (shots * self.shots_to_win).sum() / max(self.games, 1)
+        return f"Партий: {self.games}, среднее кол-во выстрелов до победы: {mean:.2f}"
+
+
+def chunked(iterable, n):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, n))
+        if not chunk:
+            return
+        yield chunk
+
+
+def generated_layouts(count, size, fleet, seed):
+    fgen = FieldGenerator(size, fleet, rng=random.Random(seed))
+    for _ in range(count):
+        yield fgen.generate_layout()
+
+
+def table_layouts(path, start, stop):
+    with LayoutTable(path) as table:
+        for i in range(start, min(stop, len(table))):
+            yield layout_ships(table[i], table.size)
+
+
+def text_layouts(path, size, fleet):
+    """Расстановки из файла в формате Field.parse_layout; неверные строки пропускаются."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if validate_layout(line, size, fleet) is None:
+                yield [parse_ship(ship_raw, size)[0] for ship_raw in line.split(";")]
+
+
+def fleet_task(source, size, fleet, chunk, pairs):
+    """Статистика расстановок одной задачи; функция уровня модуля для пула процессов.
+    :param source: ("generate", кол-во, seed) либо ("table", путь, начало, конец)
+    """
+    stats = FleetStats(size, fleet, pairs)
+    if source[0] == "generate":
+        layouts = generated_layouts(source[1], size, fleet, source[2])
+    else:
+        layouts = table_layouts(*source[1:])
+    for part in chunked(layouts, chunk):
+        stats.add_layouts(part)
+    return stats
+
+
+def shot_task(games, size, fleet, strategy, seed, chunk):
+    """Статистика выстрелов одной задачи; функция уровня модуля для пула процессов."""
+    stats = ShotStats(size)
+    rng = random.Random(seed)
+    fgen = FieldGenerator(size, fleet, rng=rng)
+    factory = get_strategy(strategy)
+    # Номер выстрела доходит до size * size: int16 хватает до поля 181*181, дальше нужен int32
+    dtype = np.int16 if size * size <= np.iinfo(np.int16).max else np.int32
+    for part in chunked(range(games), chunk):
+        order = np.zeros((len(part), size * size), dtype=dtype)
+        for k in range(len(part)):
+            target = fgen.generate_rnd_field()
+            shooter = factory(fgen.generate_rnd_field(), rng=rng)
+            n = 0
+            while target.has_alive_ships:
+                dot = shooter.next_shot()
+                shooter.add_ai_shot(dot, target.shoot(dot))
+                n += 1
+                order[k, dot.index] = n
+        stats.add_chunk(order)
+    return stats
+
+
+def run_tasks(func, tasks, workers):
+    """Выполнить задачи и сложить их статистики.
+    :param workers: кол-во процессов; 1 - в текущем процессе, 0 - по числу ядер
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = (func(*task) for task in tasks)
+        total = next(results)
+        for stats in results:
+            total.merge(stats)
+        return total
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        total = None
+        for stats in executor.map(func, *zip(*tasks)):
+            total = stats if total is None else total.merge(stats)
+        return total
+
+
+def fleet_stats(count=0, size=SIZE, fleet=None, workers=1, seed=None, table=None, text=None, chunk=CHUNK,
+                pairs=None):
+    """Статистика расстановок: count расстановок FieldGenerator, вся таблица table или файл text.
+    Задачи генерации получают seed game_seed(seed, номер задачи), поэтому результат повторяется при том же seed.
+    """
+    fleet = tuple(fleet or default_fleet(size))
+    if text:
+        stats = FleetStats(size, fleet, pairs)
+        for part in chunked(text_layouts(text, size, fleet), chunk):
+            stats.add_layouts(part)
+        return stats
+    if table:
+        with LayoutTable(table) as t:
+            size, fleet, count = t.size, t.fleet, len(t)
+        sources = [("table", table, start, start + TASK) for start in range(0, count, TASK)]
+    else:
+        seed = new_seed() if seed is None else seed
+        sources = [
+            ("generate", min(TASK, count - start), game_seed(seed, k)) for k, start in enumerate(range(0, count, TASK))
+        ]
+    if not sources:
+        return FleetStats(size, fleet, pairs)
+    return run_tasks(fleet_task, [(source, size, fleet, chunk, pairs) for source in sources], workers)
+
+
+def shot_stats(games, size=SIZE, fleet=None, strategy="simple", workers=1, seed=None, chunk=CHUNK):
+    """Статистика выстрелов стратегии strategy по games полям FieldGenerator."""
+    fleet = tuple(fleet or default_fleet(size))
+    seed = new_seed() if seed is None else seed
+    tasks = [
+        (min(TASK, games - start), size, fleet, strategy, game_seed(seed, k), chunk)
+        for k, start in enumerate(range(0, games, TASK))
+    ]
+    if not tasks:
+        return ShotStats(size)
+    return run_tasks(shot_task, tasks, workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    fleets_parser = sub.add_parser("fleets", help="занятость клеток по расстановкам")
+    fleets_parser.add_argument("--count", type=int, default=100000, help="кол-во расстановок FieldGenerator")
+    fleets_parser.add_argument("--table", help="вместо генерации - все расстановки таблицы layout_table")
+    fleets_parser.add_argument("--text", help="вместо генерации - расстановки из файла, по одной в строке")
+    shots_parser = sub.add_parser("shots", help="порядок выстрелов стратегии")
+    shots_parser.add_argument("--games", type=int, default=10000)
+    shots_parser.add_argument("--strategy", default="simple", help="имя стратегии из models_outer.STRATEGIES")
+    for p in (fleets_parser, shots_parser):
+        p.add_argument("--size", type=int, default=SIZE, help="размер поля; флот - default_fleet(size)")
+        p.add_argument("--workers", type=int, default=0, help="кол-во процессов (0 - по числу ядер)")
+        p.add_argument("--seed", type=int, help="главный seed")
+        p.add_argument("--output", "-o", help="сохранить массивы в .npz")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == "fleets":
+        stats = fleet_stats(
+            args.count, args.size, workers=args.workers, seed=args.seed, table=args.table, text=args.text,
+        )
+    else:
+        stats = shot_stats(args.games, args.size, strategy=args.strategy, workers=args.workers, seed=args.seed)
+    print(stats)
+    print(f"За {time.perf_counter() - started:.1f} с")
+    if args.output:
+        stats.save(args.output)
+
+
+if __name__ == '__main__':
+    main()
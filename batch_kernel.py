@@ -0,0 +1,146 @@
+"""Пакетное ядро: одновременная стрельба по B полям с помощью NumPy.
+
+Каждое поле - отдельная партия одного стрелка против одного флота: на каждом шаге по каждому
+активному полю делается ровно один выстрел, а поля, на которых не осталось целых палуб, выбывают.
+Правила те же, что в Field.shoot и Field.contour_killed_ship:
+- попадание в палубу (в том числе повторное) - ранил, либо убил, если у корабля не осталось целых палуб;
+- вокруг убитого корабля клетки обводятся;
+- промах по обведенной клетке показывается как промах.
+
+Строки и столбцы здесь нумеруются с 0, а не с 1, как в Dot.
+
+Требует numpy.
+"""
+import numpy as np
+
+from models_inner import SIZE, ShootResult
+
+
+MISSED = ShootResult.missed.value
+INJURE = ShootResult.injure.value
+KILLED = ShootResult.killed.value
+
+
+class BatchKernel:
+    def __init__(self, fleets, size=SIZE, rng=None):
+        """
+        :param fleets: для каждого поля - список кораблей, каждый корабль - список координат палуб (x, y) с 1
+        :param size: размер поля
+        :param rng: numpy.random.Generator для стратегий выбора выстрела
+        """
+        self.size = size
+        self.rng = rng if rng is not None else np.random.default_rng()
+        boards = len(fleets)
+        max_ships = max((len(fleet) for fleet in fleets), default=0)
+        # Номер корабля в клетке, начиная с 1; 0 - пустая клетка
+        self.ship_ids = np.zeros((boards, size, size), dtype=np.int16)
+        # Кол-во целых палуб у каждого корабля; столбец 0 соответствует пустой клетке и не используется
+        self.ship_left = np.zeros((boards, max_ships + 1), dtype=np.int16)
+        for b, fleet in enumerate(fleets):
+            for sid, cells in enumerate(fleet, 1):
+                for x, y in cells:
+                    self.ship_ids[b, x - 1, y - 1] = sid
+                self.ship_left[b, sid] = len(cells)
+        self.cells_left = self.ship_left.sum(axis=1, dtype=np.int32)  # Целые палубы на поле
+        self.hit = np.zeros((boards, size, size), dtype=bool)
+        self.missed = np.zeros((boards, size, size), dtype=bool)
+        self.contoured = np.zeros((boards, size, size), dtype=bool)
+        self.shots = np.zeros(boards, dtype=np.int32)
+        self.active = np.flatnonzero(self.cells_left)  # Поля, на которых партия еще идет
+
+    @classmethod
+    def from_fields(cls, fields, rng=None):
+        """Ядро из полей Field (например, сгенерированных FieldGenerator) одного размера."""
+        fleets = [[[(p.x, p.y) for p in s.ship_parts] for s in f.ships] for f in fields]
+        return cls(fleets, size=fields[0].size if fields else SIZE, rng=rng)
+
+    @property
+    def finished(self):
+        return self.active.size == 0
+
+    def shoot(self, rows, cols):
+        """Один выстрел по каждому активному полю.
+        :param rows: номера строк (с 0), по одному на каждое поле из self.active
+        :param cols: номера столбцов (с 0)
+        :return: массив значений ShootResult для полей из self.active на момент вызова
+        """
+        boards = self.active
+        sids = self.ship_ids[boards, rows, cols]
+        hit = sids > 0
+        fresh = hit & ~self.hit[boards, rows, cols]  # Первое попадание в эту палубу
+        self.hit[boards[hit], rows[hit], cols[hit]] = True
+        self.ship_left[boards[fresh], sids[fresh]] -= 1
+        self.cells_left[boards[fresh]] -= 1
+        killed = hit & (self.ship_left[boards, sids] == 0)
+
+        miss = ~hit
+        self.missed[boards[miss], rows[miss], cols[miss]] = True
+        self.contoured[boards[miss], rows[miss], cols[miss]] = False
+        if killed.any():
+            self.__contour(boards[killed], sids[killed])
+
+        self.shots[boards] += 1
+        self.active = boards[self.cells_left[boards] > 0]
+        return np.where(killed, KILLED, np.where(hit, INJURE, MISSED))
+
+    def __contour(self, boards, sids):
+        """Обвести убитые корабли: по одному кораблю sids[i] на поле boards[i]."""
+        ship = self.ship_ids[boards] == sids[:, None, None]
+        padded = np.zeros((len(boards), self.size + 2, self.size + 2), dtype=bool)
+        padded[:, 1:-1, 1:-1] = ship
+        near = np.zeros_like(ship)
+        for dx in range(3):
+            for dy in range(3):
+                near |= padded[:, dx:dx + self.size, dy:dy + self.size]
+        self.contoured[boards] |= near & ~ship
+
+    def unknown(self, boards=None):
+        """Клетки активных полей, о которых стрелку еще ничего не известно."""
+        boards = self.active if boards is None else boards
+        return ~(self.hit[boards] | self.missed[boards] | self.contoured[boards])
+
+    def wounded(self, boards=None):
+        """Подбитые палубы еще не убитых кораблей на активных полях."""
+        boards = self.active if boards is None else boards
+        sids = self.ship_ids[boards]
+        alive = np.take_along_axis(self.ship_left[boards], sids.reshape(len(boards), -1), axis=1)
+        return self.hit[boards] & (alive.reshape(sids.shape) > 0)
+
+    def random_targets(self):
+        """Случайная неизвестная клетка на каждом активном поле."""
+        score = self.rng.random((self.active.size, self.size, self.size))
+        return self.__best(np.where(self.unknown(), score, -1))
+
+    def hunting_targets(self):
+        """Как AI: случайный выстрел, пока нет раненого корабля, иначе добиваем его.
+        Раненый корабль добиваем по соседним с подбитыми палубами клеткам, а если подбито больше одной палубы,
+        то только вдоль линии корабля."""
+        unknown = self.unknown()
+        wounded = self.wounded()
+        rows_used = wounded.any(axis=2).sum(axis=1)
+        cols_used = wounded.any(axis=1).sum(axis=1)
+        count = wounded.sum(axis=(1, 2))
+        horizontal = ((count < 2) | (rows_used == 1))[:, None, None]
+        vertical = ((count < 2) | (cols_used == 1))[:, None, None]
+        near = np.zeros_like(wounded)
+        near[:, :, 1:] |= wounded[:, :, :-1] & horizontal
+        near[:, :, :-1] |= wounded[:, :, 1:] & horizontal
+        near[:, 1:, :] |= wounded[:, :-1, :] & vertical
+        near[:, :-1, :] |= wounded[:, 1:, :] & vertical
+        score = self.rng.random(unknown.shape) + near
+        return self.__best(np.where(unknown, score, -1))
+
+    def __best(self, score):
+        flat = score.reshape(len(score), -1).argmax(axis=1)
+        return flat // self.size, flat % self.size
+
+    def run(self, targets=None):
+        """Играть до конца все партии.
+        :param targets: стратегия - метод ядра, возвращающий (rows, cols) для активных полей;
+                        по умолчанию hunting_targets
+        :return: кол-во выстрелов до победы на каждом поле
+        """
+        targets = targets or self.hunting_targets
+        while not self.finished:
+            self.shoot(*targets())
+        return self.shots
@@ -0,0 +1,71 @@
+"""Сколько памяти занимает одна ждущая хода партия с компьютером: объектами и упакованной compact.pack_session.
+
+Запуск из корня репозитория:
+    python -m benchmarks.memory --sessions 20000 --moves 10
+"""
+import argparse
+import gc
+import random
+import tracemalloc
+
+from compact import pack_session, unpack_session
+from models_inner import Cell, FieldGenerator, default_fleet
+from models_outer import AI, GameState
+
+
+def make_session(size, moves, rng):
+    """Партия, как ее держит сервер: GameState и AI, после moves выстрелов обоих игроков."""
+    fgen = FieldGenerator(size, default_fleet(size), rng=rng)
+    state = GameState(fgen.generate_rnd_field(), fgen.generate_rnd_field())
+    ai = AI(state.fields[1])
+    user_shots = list(Cell.grid(size))
+    rng.shuffle(user_shots)
+    for _ in range(moves):
+        if state.finished:
+            break
+        if state.turn == 0:
+            state.submit_shot(0, user_shots.pop())
+        else:
+            dot = ai.next_shot()
+            ai.add_ai_shot(dot, state.submit_shot(1, dot)[0].result)
+    return state, ai
+
+
+def pack_sessions(sessions):
+    return [pack_session(state, ai) for state, ai in sessions]
+
+
+def measure(build, *args):
+    """Байт, выделенных build(*args) и еще живых после него, и результат build."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(*args)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--moves", type=int, default=10, help="выстрелов в каждой партии до замера")
+    parser.add_argument("--size", type=int, default=6)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    unpack_session(pack_session(*make_session(args.size, args.moves, rng)))  # Общие кэши клеток и размещений
+    objects_bytes, sessions = measure(lambda: [make_session(args.size, args.moves, rng) for _ in range(args.sessions)])
+    packed_bytes, packed = measure(pack_sessions, sessions)
+    del sessions
+    print(f"Партий: {args.sessions}, поле {args.size}*{args.size}, выстрелов до замера: {args.moves}")
+    print(f"Объекты (GameState + AI): {objects_bytes / args.sessions:>8.0f} байт на партию")
+    print(
+        f"compact.pack_session:     {packed_bytes / args.sessions:>8.0f} байт на партию"
+        f" (из них данные - {len(packed[0])} байт)"
+    )
+
+
+if __name__ == '__main__':
+    main()
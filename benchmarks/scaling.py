@@ -0,0 +1,104 @@
+"""Как растет стоимость генерации поля и выстрела вместе с размером поля.
+
+Первая генерация на поле каждого размера идет с пустыми кэшами вариантов размещения: ее время и память,
+которую занимают кэши после нее, - это то, что платит каждый новый процесс симуляции или запаса полей.
+
+Запуск из корня репозитория:
+    python -m benchmarks.scaling --sizes 6 10 20 50 100
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from models_inner import Dot, FieldGenerator, default_fleet, ship_placement_cells, ship_placements
+from models_outer import AI, DensityAI
+
+
+def clear_caches():
+    ship_placements.cache_clear()
+    ship_placement_cells.cache_clear()
+
+
+def cold_generation_memory(size):
+    """:return: байт, которые остаются занятыми после первой генерации с пустыми кэшами"""
+    clear_caches()
+    gc.collect()
+    tracemalloc.start()
+    FieldGenerator(size, default_fleet(size)).generate_rnd_field()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used
+
+
+def bench_generation(size, repeat):
+    """:return: (время первой генерации с пустыми кэшами вариантов, среднее время генерации), секунды"""
+    clear_caches()
+    fgen = FieldGenerator(size, default_fleet(size))
+    started = time.perf_counter()
+    fgen.generate_rnd_field()
+    first = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fgen.generate_rnd_field()
+    return first, (time.perf_counter() - started) / repeat
+
+
+def bench_shots(size, repeat):
+    """:return: среднее время Field.shoot, секунды"""
+    fgen = FieldGenerator(size, default_fleet(size))
+    dots = [Dot(x, y) for x in range(1, size + 1) for y in range(1, size + 1)]
+    total = 0.0
+    for _ in range(repeat):
+        field = fgen.generate_rnd_field()
+        random.shuffle(dots)
+        started = time.perf_counter()
+        for d in dots:
+            field.shoot(d)
+        total += time.perf_counter() - started
+    return total / (repeat * len(dots))
+
+
+def bench_ai(ai_cls, size, repeat):
+    """Компьютер стреляет по полю до победы.
+    :return: (среднее время хода вместе с выстрелом и учетом результата, секунды; среднее кол-во ходов)
+    """
+    fgen = FieldGenerator(size, default_fleet(size))
+    total = 0.0
+    moves = 0
+    for _ in range(repeat):
+        field = fgen.generate_rnd_field()
+        ai = ai_cls(field)
+        started = time.perf_counter()
+        while field.has_alive_ships:
+            dot = ai.next_shot()
+            ai.add_ai_shot(dot, field.shoot(dot))
+            moves += 1
+        total += time.perf_counter() - started
+    return total / moves, moves / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[6, 10, 20, 50, 100])
+    parser.add_argument("--repeat", type=int, default=5, help="кол-во полей на каждый замер")
+    args = parser.parse_args()
+
+    print(f"{'поле':>5} {'кораблей':>8} {'1-я генерация':>14} {'ее память':>10} {'генерация':>10} {'выстрел':>9}"
+          f" {'ход AI':>9} {'ходов AI':>9} {'ход DensityAI':>14} {'ходов DensityAI':>16}")
+    for size in args.sizes:
+        memory = cold_generation_memory(size)
+        first, gen = bench_generation(size, args.repeat)
+        shot = bench_shots(size, args.repeat)
+        ai_move, ai_moves = bench_ai(AI, size, args.repeat)
+        density_move, density_moves = bench_ai(DensityAI, size, args.repeat)
+        print(f"{size:>5} {len(default_fleet(size)):>8} {first * 1e3:>11.2f} мс {memory / 2 ** 20:>7.2f} МБ"
+              f" {gen * 1e3:>7.2f} мс"
+              f" {shot * 1e6:>6.1f} мкс {ai_move * 1e6:>6.1f} мкс {ai_moves:>9.0f}"
+              f" {density_move * 1e6:>11.1f} мкс {density_moves:>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
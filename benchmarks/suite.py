@@ -0,0 +1,231 @@
+"""Микро- и макробенчмарки ядра игры с результатами в JSON и сравнением с сохраненным базовым замером.
+
+Запуск из корня репозитория:
+    python -m benchmarks.suite run --output baseline.json
+    python -m benchmarks.suite compare baseline.json            # замерить заново и сравнить
+    python -m benchmarks.suite compare baseline.json new.json   # сравнить два сохраненных замера
+compare завершается с кодом 1, если хотя бы один бенчмарк стал медленнее больше чем на --threshold.
+Сравнивается лучшее время из прогонов: оно меньше всего зависит от фоновой нагрузки на машину.
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+from models_inner import Dot, Field, FieldGenerator, Ship, ShipPart
+from models_outer import AI, Game
+
+
+SEED = 20240601  # Одинаковые входные данные от запуска к запуску
+BENCHMARKS = {}  # Имя -> функция, возвращающая (кол-во операций, секунды, доп. показатели)
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def layouts(count):
+    """Координаты палуб кораблей для count случайных полей."""
+    fgen = FieldGenerator()
+    return [[[(p.x, p.y) for p in s.ship_parts] for s in fgen.generate_rnd_field().ships] for _ in range(count)]
+
+
+@benchmark("dot_construction")
+def bench_dot_construction():
+    coords = [(random.randint(1, 6), random.randint(1, 6)) for _ in range(20000)]
+    started = time.perf_counter()
+    for x, y in coords:
+        Dot(x, y)
+    return len(coords), time.perf_counter() - started, {}
+
+
+@benchmark("ship_add_part")
+def bench_ship_add_part():
+    ships = [[ShipPart(x, y) for x, y in ship] for layout in layouts(300) for ship in layout]
+    started = time.perf_counter()
+    for parts in ships:
+        ship = Ship()
+        for p in parts:
+            ship.add_part(p)
+    return sum(map(len, ships)), time.perf_counter() - started, {}
+
+
+@benchmark("field_add_ship")
+def bench_field_add_ship():
+    fleets = [[Ship(*[ShipPart(x, y) for x, y in ship]) for ship in layout] for layout in layouts(500)]
+    fields = [Field() for _ in fleets]
+    started = time.perf_counter()
+    for field, fleet in zip(fields, fleets):
+        for ship in fleet:
+            field.add_ship(ship)
+    return sum(map(len, fleets)), time.perf_counter() - started, {}
+
+
+@benchmark("field_shoot")
+def bench_field_shoot():
+    fgen = FieldGenerator()
+    fields = [fgen.generate_rnd_field() for _ in range(300)]
+    dots = [Dot(x, y) for x in range(1, 7) for y in range(1, 7)]
+    shots = [random.sample(dots, len(dots)) for _ in fields]
+    started = time.perf_counter()
+    for field, order in zip(fields, shots):
+        for d in order:
+            field.shoot(d)
+    return len(fields) * len(dots), time.perf_counter() - started, {}
+
+
+@benchmark("field_contour_killed_ship")
+def bench_field_contour_killed_ship():
+    fgen = FieldGenerator()
+    fields = [fgen.generate_rnd_field() for _ in range(500)]
+    ships = [(field, list(field.ships)) for field in fields]
+    started = time.perf_counter()
+    for field, fleet in ships:
+        for ship in fleet:
+            field.contour_killed_ship(ship)
+    return sum(len(fleet) for _, fleet in ships), time.perf_counter() - started, {}
+
+
+@benchmark("generate_rnd_field")
+def bench_generate_rnd_field():
+    fgen = FieldGenerator()
+    count = 500
+    rejected = dead_ends = 0
+    started = time.perf_counter()
+    for _ in range(count):
+        fgen.generate_rnd_field()
+        rejected += fgen.rejected_placements
+        dead_ends += fgen.dead_ends
+    elapsed = time.perf_counter() - started
+    return count, elapsed, {"rejected_placements_per_field": rejected / count, "dead_ends_per_field": dead_ends / count}
+
+
+@benchmark("ai_next_shot")
+def bench_ai_next_shot():
+    fgen = FieldGenerator()
+    moves = 0
+    elapsed = 0.0
+    for _ in range(300):
+        field = fgen.generate_rnd_field()
+        ai = AI(field)
+        while field.has_alive_ships:
+            started = time.perf_counter()
+            dot = ai.next_shot()
+            elapsed += time.perf_counter() - started
+            ai.add_ai_shot(dot, field.shoot(dot))
+            moves += 1
+    return moves, elapsed, {"moves_per_game": moves / 300}
+
+
+@benchmark("headless_game")
+def bench_headless_game():
+    count = 200
+    shots = 0
+    started = time.perf_counter()
+    for _ in range(count):
+        shots += Game.play_headless()[1]
+    elapsed = time.perf_counter() - started
+    return count, elapsed, {"winner_shots_per_game": shots / count}
+
+
+def run_benchmark(func, rounds):
+    """Несколько прогонов с одинаковыми входными данными и выключенным сборщиком мусора на время замера.
+    :return: показатели в наносекундах на операцию
+    """
+    per_op = []
+    extra = {}
+    for _ in range(rounds):
+        random.seed(SEED)
+        gc.collect()
+        gc.disable()
+        try:
+            ops, elapsed, extra = func()
+        finally:
+            gc.enable()
+        per_op.append(elapsed / ops * 1e9)
+    return {
+        "ops": ops,
+        "rounds": rounds,
+        "min_ns": min(per_op),
+        "median_ns": statistics.median(per_op),
+        "max_ns": max(per_op),
+        "extra": extra,
+    }
+
+
+def run_all(names, rounds):
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "rounds": rounds,
+        },
+        "results": {name: run_benchmark(BENCHMARKS[name], rounds) for name in names},
+    }
+
+
+def compare(baseline, current, threshold):
+    """:return: (строки отчета, есть ли регрессии)"""
+    lines = [f"{'бенчмарк':<28} {'было, нс':>12} {'стало, нс':>12} {'изменение':>10}"]
+    regressed = False
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            lines.append(f"{name:<28} {'-':>12} {result['min_ns']:>12.1f} {'новый':>10}")
+            continue
+        change = result["min_ns"] / base["min_ns"] - 1
+        mark = ""
+        if change > threshold:
+            mark = "  РЕГРЕССИЯ"
+            regressed = True
+        lines.append(f"{name:<28} {base['min_ns']:>12.1f} {result['min_ns']:>12.1f} {change:>+10.1%}{mark}")
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="замерить и вывести JSON")
+    run_parser.add_argument("--output", "-o", help="сохранить JSON в файл, а не выводить")
+    compare_parser = sub.add_parser("compare", help="сравнить с базовым замером")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current", nargs="?", help="сохраненный замер; без него - замерить заново")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="допустимое замедление, доля")
+    for p in (run_parser, compare_parser):
+        p.add_argument("--rounds", type=int, default=5)
+        p.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="запустить только эти бенчмарки")
+    args = parser.parse_args()
+
+    names = args.only or list(BENCHMARKS)
+    if args.command == "run":
+        results = json.dumps(run_all(names, args.rounds), ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(results + "\n")
+        else:
+            print(results)
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current, encoding="utf-8") as f:
+            current = json.load(f)
+    else:
+        current = run_all(names, args.rounds)
+    lines, regressed = compare(baseline, current, args.threshold)
+    print("\n".join(lines))
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
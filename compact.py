@@ -0,0 +1,130 @@
+"""Компактное хранение партии пользователя с компьютером (AI): несколько десятков байт вместо сотен объектов.
+
+Партия - это GameState с двумя досками и AI, который стреляет по доске игрока 0. Все, что нужно для ее
+продолжения, умещается в маски клеток: корабли восстанавливаются по маске занятых клеток, а раненый корабль
+и неубитые корабли AI - по подбитым палубам. Поэтому один процесс может держать
+в памяти сотни тысяч ждущих хода партий, а объекты создавать только для той, по которой пришел выстрел.
+
+Формат (little-endian):
+    заголовок: размер поля, чей ход, победитель (0xFF - нет), флаги (1 - AI в режиме parity),
+    цвет раскраски AI, выстрелов игрока 0 и игрока 1 (по 2 байта), seed генератора AI (8 байт);
+    затем для доски каждого игрока маски кораблей, подбитых палуб, промахов и обводки и, в конце, маска клеток,
+    которые AI еще может обстрелять - по ceil(size * size / 8) байт. Для поля 6*6 это 62 байта.
+Обводку приходится хранить: промах до убийства корабля остается под его обводкой, а промах после - нет.
+"""
+import collections
+import random
+import struct
+
+from layout_table import layout_ships, mask_width
+from models_inner import Cell, Field, SeaBattleException, Ship, ShipPart, zobrist_xor
+from models_outer import AI, GameState, User
+
+
+HEADER = struct.Struct("<BBBBBHHQ")
+FIELD_MASKS = 4  # Корабли, подбитые палубы, промахи, обводка
+NO_WINNER = 0xFF
+PARITY_FLAG = 1
+
+
+def mask_cells(mask, size):
+    grid = Cell.grid(size)
+    return [grid[i] for i in range(size * size) if mask >> i & 1]
+
+
+def killed_ships(field):
+    """Маски убитых кораблей доски."""
+    size = field.size
+    hit = field.snapshot()[0]
+    masks = []
+    for ship in layout_ships(field.occupied, size):
+        mask = 0
+        for x, y in ship:
+            mask |= 1 << ((x - 1) * size + y - 1)
+        if not mask & ~hit:
+            masks.append(mask)
+    return masks
+
+
+def pack_session(state, ai):
+    """Упаковать партию в bytes.
+    :param state: GameState; игрок 1 - компьютер ai
+    :param ai: AI, который стреляет по доске игрока 0; генератор ai при этом сдвигается на один seed
+    """
+    if type(ai) is not AI:
+        raise SeaBattleException("Упаковать можно только партию с AI.")
+    size = state.fields[0].size
+    width = mask_width(size)
+    available, _, _, colour, _ = ai.dump_state()
+    available_mask = 0
+    for cell in available:
+        available_mask |= 1 << cell.index
+    out = [HEADER.pack(
+        size, state.turn, NO_WINNER if state.winner is None else state.winner, PARITY_FLAG if ai.parity else 0,
+        colour, state.shots[0], state.shots[1], ai.rng.getrandbits(64),
+    )]
+    for field in state.fields:
+        hit, missed, contoured = field.snapshot()[:3]
+        for mask in (field.occupied, hit, missed, contoured):
+            out.append(mask.to_bytes(width, "little"))
+    out.append(available_mask.to_bytes(width, "little"))
+    return b"".join(out)
+
+
+def unpack_field(occupied, hit, missed, contoured, size):
+    """Доска с кораблями occupied и выстрелами по ней."""
+    ships = layout_ships(occupied, size)
+    field = Field(size=size, fleet=[len(ship) for ship in ships])
+    for cells in ships:
+        field.add_ship(Ship(*[ShipPart(x, y) for x, y in cells]))
+    # Хэш складывается так же, как в Field: промах под обводкой виден как обводка
+    position_hash = (
+        zobrist_xor(size, hit, 0) ^ zobrist_xor(size, contoured, 1) ^ zobrist_xor(size, missed & ~contoured, 2)
+    )
+    cells_left = bin(occupied & ~hit).count("1")
+    field.restore((hit, missed, contoured, cells_left, position_hash))
+    return field
+
+
+def unpack_session(data):
+    """Партия из pack_session.
+    :return: (GameState, AI)
+    """
+    size, turn, winner, flags, colour, shots0, shots1, seed = HEADER.unpack_from(data)
+    width = mask_width(size)
+    masks = [
+        int.from_bytes(data[HEADER.size + k * width:HEADER.size + (k + 1) * width], "little")
+        for k in range(2 * FIELD_MASKS + 1)
+    ]
+    fields = [unpack_field(*masks[FIELD_MASKS * k:FIELD_MASKS * (k + 1)], size) for k in (0, 1)]
+    state = GameState(*fields)
+    state.turn = turn
+    state.winner = None if winner == NO_WINNER else winner
+    state.shots = [shots0, shots1]
+
+    target = fields[0]
+    ai = AI(fields[1], parity=bool(flags & PARITY_FLAG), rng=random.Random(seed))
+    ships_left = collections.Counter(fields[1].fleet)
+    killed = 0
+    for mask in killed_ships(target):
+        ships_left[bin(mask).count("1")] -= 1
+        killed |= mask
+    hunting = [(c.x, c.y) for c in mask_cells(target.snapshot()[0] & ~killed, size)]
+    available = mask_cells(masks[-1], size)
+    step = min((s for s, cnt in ships_left.items() if cnt > 0), default=1) if ai.parity else 1
+    parity_dots = None if step == 1 else [c for c in available if (c.x + c.y) % step == colour]
+    ai.load_state((available, hunting, tuple(ships_left.items()), colour, parity_dots))
+    return state, ai
+
+
+def pack_game(game):
+    """Упаковать текущую партию Game (пользователь - игрок 0)."""
+    return pack_session(game.state, game.ai)
+
+
+def unpack_game(data, game):
+    """Продолжить в game партию из pack_game."""
+    game.state, game.ai = unpack_session(data)
+    game.user = User(game.state.fields[0])
+    game.shots = sum(game.state.shots)
+    return game
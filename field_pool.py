@@ -0,0 +1,161 @@
+"""Запас заранее сгенерированных полей, чтобы новая партия не ждала FieldGenerator.
+
+Поля хранятся в очередях по ключу (размер поля, флот), в каждой - не больше capacity полей.
+Фоновые потоки доливают очереди, пока они не полны; take забирает поле за O(1), а если очередь пуста -
+генерирует поле сразу, как делала бы партия без запаса. Попадания и промахи считаются в hits и misses
+(и в метриках field_pool.hits/field_pool.misses).
+
+Потоки генерируют поля сами, пока основной поток ждет ввода пользователя. С processes=True расстановки
+считаются в отдельных процессах (без GIL), а потоки только собирают из них поля.
+"""
+import collections
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+from models_inner import Field, FieldGenerator, Ship, ShipPart, default_fleet, game_seed, new_seed
+
+
+CAPACITY = 4  # Полей в очереди одного ключа
+
+FIELD_POOL_HITS = metrics.REGISTRY.counter("field_pool.hits")
+FIELD_POOL_MISSES = metrics.REGISTRY.counter("field_pool.misses")
+
+
+def generate_layouts(size, fleet, seed, count):
+    """count расстановок генератора с seed; функция уровня модуля для пула процессов."""
+    fgen = FieldGenerator(size, fleet, rng=random.Random(seed))
+    return [fgen.generate_layout() for _ in range(count)]
+
+
+def build_field(size, fleet, layout, rng=None):
+    """Поле с кораблями из расстановки FieldGenerator.generate_layout."""
+    field = Field(size=size, fleet=fleet, rng=rng)
+    for cells in layout:
+        field.add_ship(Ship(*[ShipPart(x, y) for x, y in cells]))
+    return field
+
+
+class FieldPool:
+    """Ограниченный запас полей с фоновым пополнением."""
+
+    def __init__(self, capacity=CAPACITY, workers=1, processes=False, seed=None):
+        """
+        :param capacity: полей в очереди одного ключа
+        :param workers: кол-во фоновых потоков
+        :param processes: генерировать расстановки в пуле из workers процессов
+        :param seed: главный seed; поток или задача k получает game_seed(seed, k). По умолчанию - из энтропии ОС
+        """
+        self.capacity = capacity
+        self.seed = new_seed() if seed is None else seed
+        self.hits = 0  # Полей, взятых из запаса
+        self.misses = 0  # Полей, сгенерированных в take, потому что запас был пуст
+        self.__queues = {}  # (размер, флот) -> deque готовых полей
+        self.__pending = collections.Counter()  # (размер, флот) -> полей, которые сейчас генерируются
+        self.__condition = threading.Condition()
+        self.__closed = False
+        self.__tasks = 0  # Выданных seed'ов задач
+        self.__executor = ProcessPoolExecutor(max_workers=workers) if processes else None
+        self.__threads = [
+            threading.Thread(target=self.__refill, name=f"field-pool-{k}", daemon=True) for k in range(workers)
+        ]
+        for thread in self.__threads:
+            thread.start()
+
+    @staticmethod
+    def key(size, fleet=None):
+        return size, tuple(fleet or default_fleet(size))
+
+    def prefetch(self, size, fleet=None):
+        """Начать пополнять запас полей этого размера и флота, не забирая поле."""
+        key = self.key(size, fleet)
+        with self.__condition:
+            if key not in self.__queues:
+                self.__queues[key] = collections.deque()
+                self.__condition.notify_all()
+
+    def take(self, size, fleet=None, rng=None):
+        """Готовое поле из запаса, а если запас пуст - сгенерированное сразу.
+        :param rng: генератор для поля, которое приходится генерировать сразу; по умолчанию - модуль random
+        """
+        key = self.key(size, fleet)
+        with self.__condition:
+            queue = self.__queues.get(key)
+            if queue is None:
+                queue = self.__queues[key] = collections.deque()
+            field = queue.popleft() if queue else None
+            # Место в очереди освободилось либо о ключе узнали только сейчас
+            self.__condition.notify()
+            if field is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if metrics.ENABLED:
+            (FIELD_POOL_HITS if field is not None else FIELD_POOL_MISSES).inc()
+        if field is None:
+            field = FieldGenerator(*key, rng=rng).generate_rnd_field()
+        return field
+
+    def ready(self, size, fleet=None):
+        """Готовых полей этого размера и флота."""
+        with self.__condition:
+            return len(self.__queues.get(self.key(size, fleet), ()))
+
+    def close(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        for thread in self.__threads:
+            thread.join()
+        if self.__executor is not None:
+            self.__executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __next_seed(self):
+        seed = game_seed(self.seed, self.__tasks)
+        self.__tasks += 1
+        return seed
+
+    def __refill(self):
+        """Цикл фонового потока: доливать самую пустую очередь, пока запас не полон."""
+        generators = {}  # Свои генераторы потока: FieldGenerator не рассчитан на общий доступ
+        with self.__condition:
+            rng = random.Random(self.__next_seed())
+        while True:
+            with self.__condition:
+                while True:
+                    if self.__closed:
+                        return
+                    free = {
+                        key: self.capacity - len(queue) - self.__pending[key]
+                        for key, queue in self.__queues.items()
+                    }
+                    key = max(free, key=free.get, default=None)
+                    if key is not None and free[key] > 0:
+                        break
+                    self.__condition.wait()
+                self.__pending[key] += 1
+                seed = self.__next_seed() if self.__executor is not None else None
+            field = None
+            try:
+                if self.__executor is not None:
+                    layout, = self.__executor.submit(generate_layouts, *key, seed, 1).result()
+                    field = build_field(*key, layout, rng)
+                else:
+                    if key not in generators:
+                        generators[key] = FieldGenerator(*key, rng=rng)
+                    field = generators[key].generate_rnd_field()
+            except RuntimeError:
+                # Пул процессов закрыт вместе с запасом
+                return
+            finally:
+                with self.__condition:
+                    self.__pending[key] -= 1
+                    if field is not None:
+                        self.__queues[key].append(field)
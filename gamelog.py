@@ -0,0 +1,294 @@
+"""Компактный двоичный архив партий: для каждой партии - seed, оба флота и все выстрелы с результатами.
+
+Файл только дописывается: заголовок файла, затем записи партий подряд. Запись партии начинается с ее длины,
+поэтому читатель через mmap переходит от партии к партии, не разбирая их флоты и ходы, а внутри партии
+находит k-й ход без разбора предыдущих: записи ходов одинаковой длины. Партия пишется в файл одной записью,
+когда закончена, а недописанная при сбое последняя запись не учитывается и отрезается при следующем открытии
+архива на запись.
+
+Заголовок файла: "SBLG", версия (1 байт). Запись партии (little-endian):
+    длина записи без этих 4 байт (4 байта), номер партии (8 байт), seed (8 байт), размер поля (2 байта),
+    длина записи хода (1 байт), кол-во ходов (4 байта),
+    затем для каждого из двух игроков: кол-во кораблей (2 байта) и по 3 байта на корабль -
+    номер первой палубы (x - 1) * size + (y - 1) и длина корабля, у вертикальных со старшим битом,
+    затем ходы.
+Запись хода - номер клетки << 3 | игрок << 2 | ShootResult.value: 2 байта, пока клеток на поле не больше 8192,
+иначе 4 байта.
+"""
+import array
+import collections
+import mmap
+import os
+import struct
+
+from models_inner import Cell, Field, SeaBattleException, Ship, ShipDirection, ShipPart, ShootResult
+
+
+MAGIC = b"SBLG"
+VERSION = 2
+FILE_HEADER = struct.Struct("<4sB")
+LENGTH = struct.Struct("<I")
+GAME_HEADER = struct.Struct("<QQHBI")  # Номер партии, seed, размер поля, длина записи хода, кол-во ходов
+SHIP_COUNT = struct.Struct("<H")
+SHIP = struct.Struct("<HB")
+VERTICAL_FLAG = 0x80
+MOVE_FORMATS = {2: "<H", 4: "<I"}
+BUFFER_SIZE = 1 << 16  # Байт, которые копятся в памяти перед записью в файл
+RESULTS = {r.value: r for r in ShootResult}
+
+LoggedMove = collections.namedtuple("LoggedMove", "player cell result")  # player - 0 (первый) или 1
+
+
+def move_width(size):
+    return 2 if size * size <= 1 << 13 else 4
+
+
+def encode_fleet(field):
+    ships = list(field.ships)
+    out = [SHIP_COUNT.pack(len(ships))]
+    for ship in ships:
+        first = min(ship.ship_parts, key=lambda p: (p.x, p.y))
+        length = ship.size | (VERTICAL_FLAG if ship.direction == ShipDirection.vertical else 0)
+        out.append(SHIP.pack((first.x - 1) * field.size + first.y - 1, length))
+    return b"".join(out)
+
+
+class GameRecord:
+    """Запись одной партии, которая копится в памяти до конца партии."""
+
+    def __init__(self, first_field, second_field, seed=0, game=0):
+        """
+        :param first_field: поле первого игрока (в Game - пользователя)
+        :param second_field: поле второго игрока
+        :param seed: seed генератора случайных чисел партии, если он известен
+        :param game: номер партии в сессии или прогоне
+        """
+        self.size = first_field.size
+        self.seed = seed
+        self.game = game
+        self.__move = struct.Struct(MOVE_FORMATS[move_width(self.size)])
+        self.__fleets = encode_fleet(first_field) + encode_fleet(second_field)
+        self.__moves = bytearray()
+        self.moves = 0
+
+    def record(self, player, dot, result):
+        """Записать выстрел игрока player (0 или 1) по полю противника."""
+        i = (dot.x - 1) * self.size + dot.y - 1
+        self.__moves += self.__move.pack(i << 3 | player << 2 | result.value)
+        self.moves += 1
+
+    def encode(self):
+        """Запись партии для архива, вместе с длиной."""
+        header = GAME_HEADER.pack(self.game, self.seed, self.size, self.__move.size, self.moves)
+        length = len(header) + len(self.__fleets) + len(self.__moves)
+        return b"".join((LENGTH.pack(length), header, self.__fleets, self.__moves))
+
+
+class GameLogBuffer:
+    """Архив партий в памяти: так процессы симуляции готовят свою часть архива для GameLogWriter.write."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.games = 0  # Записанных партий
+        self.current = None  # GameRecord текущей партии
+
+    def begin(self, first_field, second_field, seed=0, game=0):
+        """Начать запись партии; аргументы - как у GameRecord."""
+        self.end()
+        self.current = GameRecord(first_field, second_field, seed, game)
+        return self.current
+
+    def record(self, player, dot, result):
+        self.current.record(player, dot, result)
+
+    def end(self):
+        """Дописать текущую партию, если она начата."""
+        if self.current is not None:
+            self.write(self.current.encode())
+            self.games += 1
+            self.current = None
+
+    def write(self, data):
+        """Дописать готовые записи партий."""
+        self.data += data
+
+
+def check_header(buffer):
+    try:
+        magic, version = FILE_HEADER.unpack_from(buffer)
+    except struct.error:
+        magic = version = None
+    if magic != MAGIC or version != VERSION:
+        raise SeaBattleException("Файл не является архивом партий.")
+
+
+def game_offsets(buffer):
+    """Смещения записей партий, переходя по их длинам.
+    :return: (array смещений, конец последней целой записи)
+    """
+    offsets = array.array("Q")
+    offset = FILE_HEADER.size
+    end = len(buffer)
+    while offset + LENGTH.size <= end:
+        length, = LENGTH.unpack_from(buffer, offset)
+        if offset + LENGTH.size + length > end:
+            break  # Недописанная запись
+        offsets.append(offset)
+        offset += LENGTH.size + length
+    return offsets, offset
+
+
+class GameLogWriter(GameLogBuffer):
+    """Архив партий в файле: записи партий дописываются в конец через буфер."""
+
+    def __init__(self, path, buffer_size=BUFFER_SIZE):
+        """
+        :param path: файл архива; если он есть, партии дописываются после уже записанных
+        """
+        super().__init__()
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size:
+            with open(path, "r+b") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                check_header(buffer)
+                _, end = game_offsets(buffer)
+                if end < size:
+                    # Отрезаем недописанную при сбое запись, иначе следующие партии за ней не найти
+                    buffer.close()
+                    f.truncate(end)
+        self.__file = open(path, "ab", buffering=buffer_size)
+        if not size:
+            self.__file.write(FILE_HEADER.pack(MAGIC, VERSION))
+
+    def write(self, data):
+        self.__file.write(data)
+
+    def flush(self):
+        self.__file.flush()
+
+    def close(self):
+        """Дописать текущую партию и закрыть файл."""
+        self.end()
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LoggedGame:
+    """Партия архива: флоты разбираются сразу, а ходы - только по запросу."""
+
+    def __init__(self, buffer, offset):
+        """
+        :param buffer: отображение файла архива
+        :param offset: смещение записи партии
+        """
+        self.__buffer = buffer
+        length, = LENGTH.unpack_from(buffer, offset)
+        end = offset + LENGTH.size + length
+        offset += LENGTH.size
+        self.game, self.seed, self.size, width, moves = GAME_HEADER.unpack_from(buffer, offset)
+        offset += GAME_HEADER.size
+        self.fleets = []  # Для каждого игрока - список кораблей, корабль - кортеж координат палуб
+        for _ in range(2):
+            count, = SHIP_COUNT.unpack_from(buffer, offset)
+            offset += SHIP_COUNT.size
+            fleet = []
+            for start, length in SHIP.iter_unpack(buffer[offset:offset + count * SHIP.size]):
+                x, y = divmod(start, self.size)
+                dx, dy = (1, 0) if length & VERTICAL_FLAG else (0, 1)
+                fleet.append(tuple((x + 1 + k * dx, y + 1 + k * dy) for k in range(length & ~VERTICAL_FLAG)))
+            offset += count * SHIP.size
+            self.fleets.append(fleet)
+        self.__moves_offset = offset
+        self.__move = struct.Struct(MOVE_FORMATS[width])
+        self.__len = min(moves, (end - offset) // width)
+
+    def __len__(self):
+        return self.__len
+
+    def __decode(self, value):
+        i, player, result = value >> 3, value >> 2 & 1, value & 3
+        return LoggedMove(player, Cell.at(i // self.size + 1, i % self.size + 1, self.size), RESULTS[result])
+
+    def move(self, k):
+        """k-й ход, считая с 0."""
+        if not 0 <= k < self.__len:
+            raise IndexError(k)
+        value, = self.__move.unpack_from(self.__buffer, self.__moves_offset + k * self.__move.size)
+        return self.__decode(value)
+
+    def moves(self, start=0, stop=None):
+        """Ходы с start до stop: сразу переходим к нужной записи, а предыдущие не читаем."""
+        stop = self.__len if stop is None else min(stop, self.__len)
+        begin = self.__moves_offset + start * self.__move.size
+        end = self.__moves_offset + max(stop, start) * self.__move.size
+        for value, in self.__move.iter_unpack(self.__buffer[begin:end]):
+            yield self.__decode(value)
+
+    def __iter__(self):
+        return self.moves()
+
+    def fields(self, upto=None):
+        """Поля обоих игроков после первых upto ходов (по умолчанию - после всех).
+        :return: (поле первого игрока, поле второго игрока)
+        """
+        fields = [
+            Field(
+                *[Ship(*[ShipPart(x, y) for x, y in ship]) for ship in fleet],
+                size=self.size, fleet=[len(ship) for ship in fleet],
+            )
+            for fleet in self.fleets
+        ]
+        for k, (player, cell, result) in enumerate(self.moves(0, upto)):
+            if fields[1 - player].shoot(cell) != result:
+                raise SeaBattleException(f"Журнал не согласован с полем на ходе {k}.")
+        return fields[0], fields[1]
+
+
+class GameLogReader:
+    """Чтение архива через mmap. При открытии читаются только длины записей партий,
+    после этого n-я партия находится сразу."""
+
+    def __init__(self, path):
+        if not os.path.getsize(path):
+            raise SeaBattleException("Файл не является архивом партий.")
+        with open(path, "rb") as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            check_header(self.__map)
+        except SeaBattleException:
+            self.close()
+            raise
+        self.__offsets, _ = game_offsets(self.__map)
+
+    def close(self):
+        self.__map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.__offsets)
+
+    def game(self, n):
+        """n-я партия архива, считая с 0."""
+        if not 0 <= n < len(self.__offsets):
+            raise IndexError(n)
+        return LoggedGame(self.__map, self.__offsets[n])
+
+    __getitem__ = game
+
+    def games(self, start=0, stop=None):
+        """Партии с start до stop; предыдущие не разбираются."""
+        stop = len(self.__offsets) if stop is None else min(stop, len(self.__offsets))
+        for n in range(start, stop):
+            yield LoggedGame(self.__map, self.__offsets[n])
+
+    def __iter__(self):
+        return self.games()
@@ -0,0 +1,222 @@
+"""Таблица всех допустимых расстановок флота на поле: перечисляется один раз и хранится на диске.
+
+Корабли не касаются друг друга даже углами, поэтому расстановка однозначно задается маской занятых клеток
+(бит (x - 1) * size + (y - 1)), а корабли восстанавливаются из нее как связные куски. В файле - заголовок
+и маски подряд, по ceil(size * size / 8) байт на расстановку: для 6*6 и FLEET это 526888 расстановок по 5 байт.
+Между заголовком и масками - счетчики, собранные при перечислении: для каждого размера корабля и каждой клетки,
+в скольких расстановках клетку занимает корабль такого размера (по 8 байт).
+Файл открывается через mmap, поэтому кол-во расстановок и счетчики известны сразу, а случайная расстановка
+выбирается за O(1) и равновероятно среди всех расстановок. Игра и симуляция берут поля из таблицы
+с ключом --layouts (см. main.py).
+
+Сборка таблицы и вывод вероятностей занятости клеток:
+    python layout_table.py build --output layouts_6x6.bin
+    python layout_table.py count layouts_6x6.bin --cells
+"""
+import argparse
+import contextlib
+import mmap
+import random
+import struct
+import time
+
+from models_inner import FLEET, SIZE, SeaBattleException, default_fleet, ship_placements
+
+
+MAGIC = b"SBLT"
+VERSION = 2
+HEADER = struct.Struct("<4sBHBQB")  # Метка, версия, размер поля, байт на маску, кол-во расстановок, кол-во кораблей
+COUNT = struct.Struct("<Q")
+
+
+def mask_width(size):
+    return (size * size + 7) // 8
+
+
+def enumerate_layouts(size=SIZE, fleet=FLEET, counts=None):
+    """Маски всех расстановок флота, каждая ровно один раз.
+    Одинаковые корабли ставятся только в порядке возрастания номера варианта, чтобы не считать перестановки.
+    :param counts: словарь размер корабля -> список по клеткам; в него добавляется, в скольких расстановках
+                   корабль такого размера занимает клетку. Корабль учитывается один раз на все расстановки
+                   под ним в переборе, а не в каждой из них
+    """
+    fleet = sorted(fleet, reverse=True)
+    # Перебор проходит варианты много раз, поэтому их маски считаем один раз на весь перебор
+    placements = {}
+    for s in set(fleet):
+        variants = ship_placements(size, s)
+        placements[s] = [(variants.mask(i), variants.halo(i)) for i in range(len(variants))]
+
+    def place(k, blocked, occupied, first):
+        """:return: кол-во расстановок, выданных этим вызовом"""
+        if k == len(fleet):
+            yield occupied
+            return 1
+        variants = placements[fleet[k]]
+        same_next = k + 1 < len(fleet) and fleet[k + 1] == fleet[k]
+        total = 0
+        for i in range(first, len(variants)):
+            mask, halo = variants[i]
+            if not mask & blocked:
+                found = yield from place(k + 1, blocked | halo, occupied | mask, i + 1 if same_next else 0)
+                if counts is not None and found:
+                    cells = counts[fleet[k]]
+                    for c in ship_placements(size, fleet[k]).cell_indexes(i):
+                        cells[c] += found
+                total += found
+        return total
+
+    return place(0, 0, 0, 0)
+
+
+def layout_ships(mask, size):
+    """Корабли расстановки по ее маске: координаты палуб каждого, от длинных кораблей к коротким."""
+    ships = []
+    seen = 0
+    for i in range(size * size):
+        bit = 1 << i
+        if not mask & bit or seen & bit:
+            continue
+        # Первая встреченная клетка корабля - его верхняя левая палуба
+        x, y = divmod(i, size)
+        step = 1 if y + 1 < size and mask >> (i + 1) & 1 else size
+        cells = []
+        while i < size * size and mask >> i & 1 and (step == size or i // size == x):
+            seen |= 1 << i
+            cells.append((i // size + 1, i % size + 1))
+            i += step
+        ships.append(tuple(cells))
+    ships.sort(key=len, reverse=True)
+    return ships
+
+
+def build_table(path, size=SIZE, fleet=FLEET):
+    """Перечислить все расстановки и записать таблицу в path.
+    :return: кол-во расстановок
+    """
+    fleet = sorted(fleet, reverse=True)
+    width = mask_width(size)
+    body = bytearray()
+    count = 0
+    counts = {s: [0] * (size * size) for s in set(fleet)}
+    for mask in enumerate_layouts(size, fleet, counts):
+        body += mask.to_bytes(width, "little")
+        count += 1
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, size, width, count, len(fleet)))
+        f.write(bytes(fleet))
+        for ship_size in sorted(counts):
+            f.write(b"".join(COUNT.pack(n) for n in counts[ship_size]))
+        f.write(body)
+    return count
+
+
+class LayoutTable:
+    """Таблица расстановок из файла build_table."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.size, self.__width, self.__count, ships = HEADER.unpack_from(self.__map)
+        except struct.error:
+            magic = version = None
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise SeaBattleException("Файл не является таблицей расстановок.")
+        self.fleet = tuple(self.__map[HEADER.size:HEADER.size + ships])
+        offset = HEADER.size + ships
+        self.__counts = {}  # Размер корабля -> смещение счетчиков по клеткам
+        for ship_size in sorted(set(self.fleet)):
+            self.__counts[ship_size] = offset
+            offset += self.size * self.size * COUNT.size
+        self.__offset = offset
+        if len(self.__map) < self.__offset + self.__count * self.__width:
+            self.close()
+            raise SeaBattleException("Таблица расстановок обрезана.")
+
+    def close(self):
+        self.__map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.__count
+
+    def __getitem__(self, i):
+        """Маска i-й расстановки."""
+        if not 0 <= i < self.__count:
+            raise IndexError(i)
+        start = self.__offset + i * self.__width
+        return int.from_bytes(self.__map[start:start + self.__width], "little")
+
+    def ships(self, i):
+        """Координаты палуб кораблей i-й расстановки."""
+        return layout_ships(self[i], self.size)
+
+    def sample(self, rng=random):
+        """Номер случайной расстановки; все расстановки равновероятны."""
+        return rng.randrange(self.__count)
+
+    def occupancy(self, ship_size=None):
+        """В скольких расстановках занята каждая клетка: список по номерам клеток ((x - 1) * size + y - 1).
+        Берется из таблицы готовым, без перебора расстановок.
+        :param ship_size: считать только корабли такого размера; по умолчанию - все
+        """
+        sizes = self.__counts if ship_size is None else [ship_size]
+        total = [0] * (self.size * self.size)
+        for s in sizes:
+            if s not in self.__counts:
+                raise SeaBattleException(f"Кораблей размером в {s} палуб во флоте таблицы нет.")
+            start = self.__counts[s]
+            end = start + self.size * self.size * COUNT.size
+            for c, (n,) in enumerate(COUNT.iter_unpack(self.__map[start:end])):
+                total[c] += n
+        return total
+
+    def cell_count(self, x, y, ship_size=None):
+        """В скольких расстановках клетку (x, y) занимает корабль (размером ship_size, если задан)."""
+        sizes = self.__counts if ship_size is None else [ship_size]
+        offset = ((x - 1) * self.size + y - 1) * COUNT.size
+        return sum(COUNT.unpack_from(self.__map, self.__counts[s] + offset)[0] for s in sizes)
+
+    def matches(self, size, fleet):
+        return self.size == size and sorted(self.fleet) == sorted(fleet)
+
+
+def open_layouts(path):
+    """LayoutTable по пути или пустой контекст (None), если пути нет."""
+    return LayoutTable(path) if path else contextlib.nullcontext()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="перечислить расстановки и записать таблицу")
+    build_parser.add_argument("--output", "-o", default=f"layouts_{SIZE}x{SIZE}.bin")
+    build_parser.add_argument("--size", type=int, default=SIZE, help="размер поля; флот - default_fleet(size)")
+    count_parser = sub.add_parser("count", help="кол-во расстановок в таблице")
+    count_parser.add_argument("path")
+    count_parser.add_argument("--cells", action="store_true", help="вывести долю расстановок, занимающих каждую клетку")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        count = build_table(args.output, args.size, default_fleet(args.size))
+        print(f"Расстановок: {count}, записано в {args.output} за {time.perf_counter() - started:.1f} с")
+    else:
+        with LayoutTable(args.path) as table:
+            print(len(table))
+            if args.cells:
+                occupancy = table.occupancy()
+                for x in range(table.size):
+                    row = occupancy[x * table.size:(x + 1) * table.size]
+                    print(" ".join(f"{n / len(table):.3f}" for n in row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Потоковая проверка файлов с расстановками кораблей, по одной расстановке в строке.
+
+Строки задаются как для Field.parse_layout: "1,1 1,2 1,3; 4,2 4,3; 6,1 6,2; 1,5; 3,6; 6,4; 6,6".
+Проверка идет на масках клеток, без объектов Field/Ship/ShipPart, а текст ошибки совпадает с тем,
+который дал бы Field.parse_layout (для строк, которые не разобрать, - "Ошибка парсинга координат.").
+
+Запуск:
+    python layout_validator.py layouts.txt --workers 4 --errors-only > report.jsonl
+Каждая строка отчета - JSON: {"line": номер строки с 1, "ok": true/false, "error": текст ошибки или null}.
+"""
+import argparse
+import collections
+import functools
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from models_inner import FLEET, SIZE, default_fleet, neighbourhood_mask
+
+
+PARSE_ERROR = "Ошибка парсинга координат."
+CHUNK_LINES = 20000  # Строк в одной задаче для пула процессов
+SHIP_CACHE_SIZE = 1 << 16  # Запомненных разборов кораблей
+
+LayoutResult = collections.namedtuple("LayoutResult", "line ok error")
+
+
+def ship_text(parts):
+    """Текст корабля, как его выводит Ship.__str__ для целых палуб."""
+    return "Корабль со следующими палубами:\n" + "\n".join(f"Палуба ({x},{y}) целая." for x, y in parts)
+
+
+@functools.lru_cache(maxsize=None)
+def fleet_limits(fleet):
+    """Размер корабля -> сколько таких может быть."""
+    return dict(collections.Counter(fleet))
+
+
+@functools.lru_cache(maxsize=SHIP_CACHE_SIZE)
+def parse_ship(ship_raw, size):
+    """Корабль из описания между точками с запятой, с проверками Dot и Ship.add_part.
+    В файлах расстановок одни и те же корабли повторяются, поэтому разбор запоминается.
+    :return: (палубы в порядке ввода, маска или 0 для корабля за пределами поля, маска с окрестностью)
+        либо текст ошибки
+    """
+    parts = []
+    direction = None  # "x" - горизонтальный (одна строка), "y" - вертикальный
+    for coords in ship_raw.split():
+        try:
+            x, y = map(int, coords.split(","))
+        except ValueError:
+            return PARSE_ERROR
+        if x <= 0 or y <= 0:
+            return "Координаты должны быть больше нуля."
+        if parts:
+            if (x, y) in parts:
+                return "Такая палуба уже есть на корабле."
+            if direction == "x":
+                can_add = any(px == x and abs(py - y) == 1 for px, py in parts)
+            elif direction == "y":
+                can_add = any(py == y and abs(px - x) == 1 for px, py in parts)
+            else:
+                px, py = parts[0]
+                if px == x and abs(py - y) == 1:
+                    direction = "x"
+                elif py == y and abs(px - x) == 1:
+                    direction = "y"
+                can_add = direction is not None
+            if not can_add:
+                return "Палуба не соприкасается с уже имеющимися на корабле, либо содержит неверное направление"
+        parts.append((x, y))
+    mask = 0
+    if all(x <= size and y <= size for x, y in parts):
+        for x, y in parts:
+            mask |= 1 << ((x - 1) * size + y - 1)
+    return tuple(parts), mask, neighbourhood_mask(mask, size)
+
+
+def validate_layout(line, size=SIZE, fleet=FLEET):
+    """Проверить расстановку в том же порядке, что и Field.parse_layout, но без объектов поля и кораблей.
+    :return: None, если расстановка верна, иначе текст ошибки
+    """
+    limits = fleet_limits(tuple(fleet))
+    counts = {}
+    ships = []  # Палубы принятых кораблей
+    masks = []  # Маски принятых кораблей
+    occupied = forbidden = 0  # Клетки принятых кораблей; они же вместе с окрестностью
+    for ship_raw in line.split(";"):
+        ship = parse_ship(ship_raw, size)
+        if type(ship) is str:
+            return ship
+        parts, mask, halo = ship
+        # Корабль с теми же клетками, что и принятый, стоит на его первой палубе - как в Field.__ship_at
+        if mask & occupied and mask in masks:
+            return "Такой корабль уже есть на поле."
+        ship_size = len(parts)
+        limit = limits.get(ship_size)
+        if not limit:
+            return f"Корабля размером в {ship_size} палуб не может быть."
+        count = counts.get(ship_size, 0)
+        if count == limit:
+            return f"Кораблей размером в {ship_size} палуб может быть только {limit}."
+        if not mask:
+            return "Корабль  выходит за размеры поля."
+        if mask & forbidden:
+            neighbour = ships[neighbour_ship(parts, masks, size)]
+            return f"{ship_text(parts)} \nне может быть размещен вместе с кораблем ниже.\n{ship_text(neighbour)}"
+        ships.append(parts)
+        masks.append(mask)
+        counts[ship_size] = count + 1
+        occupied |= mask
+        forbidden |= halo
+    if counts != limits:
+        return "Не заданы все корабли."
+    return None
+
+
+def neighbour_ship(parts, masks, size):
+    """Номер корабля, соприкасающегося с parts, в том же порядке обхода, что и у Field."""
+    for x, y in parts:
+        for nx in range(x - 1, x + 2):
+            for ny in range(y - 1, y + 2):
+                if 0 < nx <= size and 0 < ny <= size:
+                    bit = 1 << ((nx - 1) * size + ny - 1)
+                    for i, mask in enumerate(masks):
+                        if mask & bit:
+                            return i
+    return None
+
+
+def validate_lines(lines, size=SIZE, fleet=FLEET):
+    """Тексты ошибок (None для верных) для списка строк; функция уровня модуля для пула процессов."""
+    return [validate_layout(line.rstrip("\r\n"), size, fleet) for line in lines]
+
+
+def validate_stream(lines, size=SIZE, fleet=FLEET, workers=1, chunk_lines=CHUNK_LINES):
+    """Результаты проверки строк по порядку, не читая весь поток в память.
+    :param lines: итерируемые строки, например открытый файл
+    :param workers: кол-во процессов; 1 - проверять в текущем процессе, 0 - по числу ядер
+    :return: генератор LayoutResult
+    """
+    workers = workers or os.cpu_count() or 1
+    lines = iter(lines)
+    number = 0
+    if workers == 1:
+        for line in lines:
+            number += 1
+            error = validate_layout(line.rstrip("\r\n"), size, fleet)
+            yield LayoutResult(number, error is None, error)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        while True:
+            # Держим в работе по два куска на процесс: так процессы не простаивают, а память ограничена
+            while len(pending) < 2 * workers:
+                chunk = list(itertools.islice(lines, chunk_lines))
+                if not chunk:
+                    break
+                pending.append(executor.submit(validate_lines, chunk, size, fleet))
+            if not pending:
+                return
+            for error in pending.popleft().result():
+                number += 1
+                yield LayoutResult(number, error is None, error)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="файл с расстановками; - для стандартного ввода")
+    parser.add_argument("--size", type=int, default=SIZE, help="размер поля; флот - default_fleet(size)")
+    parser.add_argument("--workers", type=int, default=1, help="кол-во процессов (0 - по числу ядер)")
+    parser.add_argument("--errors-only", action="store_true", help="выводить только неверные расстановки")
+    args = parser.parse_args()
+
+    stream = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+    total = invalid = 0
+    started = time.perf_counter()
+    try:
+        for result in validate_stream(stream, args.size, default_fleet(args.size), args.workers):
+            total += 1
+            if not result.ok:
+                invalid += 1
+            if not (args.errors_only and result.ok):
+                sys.stdout.write(json.dumps(result._asdict(), ensure_ascii=False) + "\n")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    elapsed = time.perf_counter() - started
+    print(
+        f"Строк: {total}, неверных: {invalid}, {total / elapsed if elapsed else 0:.0f} строк/с",
+        file=sys.stderr,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Нагрузочный клиент для server.py: много одновременных сессий, каждая играет партии случайными выстрелами.
+
+Запуск (сервер должен быть уже запущен):
+    python loadgen.py --sessions 1000 --games 5
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from models_inner import SIZE
+
+
+FINAL_LINES = ("TURN", "END")
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = []  # Время ответа на каждый выстрел, секунды
+        self.games = 0
+        self.errors = 0
+
+    @staticmethod
+    def percentile(values, q):
+        if not values:
+            return 0.0
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def report(self, elapsed):
+        return (
+            f"Партий: {self.games} за {elapsed:.2f} с ({self.games / elapsed:.1f} партий/с), ошибок: {self.errors}"
+            f"\nХодов: {len(self.latencies)}, задержка хода p50: {self.percentile(self.latencies, 0.5) * 1e3:.2f} мс,"
+            f" p99: {self.percentile(self.latencies, 0.99) * 1e3:.2f} мс"
+        )
+
+
+async def request(reader, writer, line):
+    """Отправить команду и прочитать ответ до TURN, END или ERR включительно."""
+    writer.write((line + "\n").encode("utf-8"))
+    await writer.drain()
+    lines = []
+    while True:
+        raw = await reader.readline()
+        if not raw:
+            raise ConnectionError("Сервер закрыл соединение.")
+        answer = raw.decode("utf-8").rstrip("\n")
+        lines.append(answer)
+        if answer in FINAL_LINES or answer.startswith("ERR"):
+            return lines
+
+
+async def play_session(host, port, games, size, stats):
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 16)
+    try:
+        for _ in range(games):
+            await request(reader, writer, "NEW")
+            shots = [(x, y) for x in range(1, size + 1) for y in range(1, size + 1)]
+            random.shuffle(shots)
+            for x, y in shots:
+                started = time.perf_counter()
+                lines = await request(reader, writer, f"SHOT {x} {y}")
+                stats.latencies.append(time.perf_counter() - started)
+                if lines[-1].startswith("ERR"):
+                    stats.errors += 1
+                if lines[-1] != "TURN":
+                    break
+            stats.games += 1
+        writer.write(b"QUIT\n")
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def run(host, port, sessions, games, size):
+    stats = LoadStats()
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(play_session(host, port, games, size, stats) for _ in range(sessions)),
+        return_exceptions=True,
+    )
+    stats.errors += sum(1 for r in results if isinstance(r, Exception))
+    return stats, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sessions", type=int, default=100, help="кол-во одновременных соединений")
+    parser.add_argument("--games", type=int, default=1, help="партий на каждое соединение")
+    parser.add_argument("--size", type=int, default=SIZE, help="размер поля на сервере")
+    args = parser.parse_args()
+    stats, elapsed = asyncio.run(run(args.host, args.port, args.sessions, args.games, args.size))
+    print(stats.report(elapsed))
+
+
+if __name__ == '__main__':
+    main()
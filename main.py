@@ -1,24 +1,124 @@
-from models_outer import Game
+import argparse
+
+import metrics
+from field_pool import CAPACITY, FieldPool
+from layout_table import open_layouts
+from models_inner import SIZE
+from models_outer import STRATEGIES, Game
+from renderer import BoardRenderer
 
 YES_CHAR = 'y'  # Положительное подтверждение от пользователя
 
 
-if __name__ == '__main__':
+def play_interactive(size=SIZE, ansi=False, profile_path=None, log_path=None, ai="simple", seed=None,
+                     pool_capacity=CAPACITY, layouts_path=None):
+    """
+    :param pool_capacity: сколько полей держать готовыми в фоне (0 - генерировать при старте партии).
+                          С seed запас не используется, чтобы партии повторялись
+    :param layouts_path: таблица расстановок (см. layout_table), из которой берутся поля; открывается через mmap
+                         один раз на сессию, и запас полей с ней не нужен
+    """
+    with open_layouts(layouts_path) as layouts:
+        pool = FieldPool(pool_capacity) if pool_capacity and seed is None and layouts is None else None
+        try:
+            play_session(size, ansi, profile_path, log_path, ai, seed, pool, layouts)
+        finally:
+            if pool is not None:
+                pool.close()
+
+
+def play_session(size, ansi, profile_path, log_path, ai, seed, pool, layouts=None):
     first_game = True
-    g = Game()
+    g = Game(
+        size=size, renderer=BoardRenderer(ansi=ansi), profile_path=profile_path, log_path=log_path, ai=ai, seed=seed,
+        pool=pool, layouts=layouts,
+    )
     g.greet()
-    while True:
-        print(
-            "Хотите сыграть в",
-            "новую" if not first_game else "",
-            f"игру? ({YES_CHAR} - да, любой другой символ - нет)"
-        )
-        first_game = False
-        if input().strip() != YES_CHAR:
-            break
-        print(
-            "Ваше игровое поле можно сгенерировать случайно, либо ввести вручную."
-            f"\nДля генерации введите ({YES_CHAR}). Любой другой символ - задать вручную"
-        )
-        g.auto_field = input().strip() == YES_CHAR
-        g.start()
+    try:
+        while True:
+            print(
+                "Хотите сыграть в",
+                "новую" if not first_game else "",
+                f"игру? ({YES_CHAR} - да, любой другой символ - нет)"
+            )
+            first_game = False
+            if input().strip() != YES_CHAR:
+                break
+            print(
+                "Ваше игровое поле можно сгенерировать случайно, либо ввести вручную."
+                f"\nДля генерации введите ({YES_CHAR}). Любой другой символ - задать вручную"
+            )
+            g.auto_field = input().strip() == YES_CHAR
+            g.start()
+    finally:
+        g.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Игра \"морской бой\" c компьютером.")
+    parser.add_argument(
+        "--simulate", type=int, metavar="N",
+        help="сыграть N партий компьютера против компьютера без ввода-вывода и вывести статистику",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, metavar="K",
+        help="кол-во процессов для --simulate (0 - по числу ядер)",
+    )
+    parser.add_argument(
+        "--seed", type=int,
+        help="главный seed: партии --simulate и партии сессии повторяются при том же seed",
+    )
+    parser.add_argument(
+        "--size", type=int, default=SIZE,
+        help=f"размер поля (по умолчанию {SIZE}); флот подбирается под размер поля",
+    )
+    parser.add_argument(
+        "--ai", default="simple", choices=sorted(STRATEGIES),
+        help="стратегия компьютера (по умолчанию simple); сравнить стратегии можно в tournament.py",
+    )
+    parser.add_argument(
+        "--pool", type=int, default=CAPACITY, metavar="N",
+        help=f"держать готовыми N полей, сгенерированных в фоне (по умолчанию {CAPACITY}; 0 - не держать;"
+             " с --seed не используется)",
+    )
+    parser.add_argument(
+        "--layouts", metavar="FILE",
+        help="брать поля из таблицы расстановок FILE (см. layout_table.py) - для партий и для --simulate;"
+             " таблица должна быть построена для того же --size",
+    )
+    parser.add_argument(
+        "--ansi", action="store_true",
+        help="перерисовывать на экране только изменившиеся клетки (терминал с поддержкой ANSI)",
+    )
+    parser.add_argument(
+        "--metrics", metavar="FILE",
+        help="собирать метрики и при выходе сохранить их в FILE (JSON); в --simulate - только при --workers 1",
+    )
+    parser.add_argument(
+        "--profile", metavar="FILE",
+        help="профилировать каждую партию cProfile и сохранить статистику последней партии в FILE",
+    )
+    parser.add_argument(
+        "--log", metavar="FILE",
+        help="дописывать каждую партию, в том числе партии --simulate, в двоичный архив FILE (см. gamelog.py)",
+    )
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    metrics.enable(bool(args.metrics))
+    try:
+        if args.simulate:
+            from simulation import simulate
+            print(simulate(
+                args.simulate, args.workers, size=args.size, seed=args.seed, log_path=args.log,
+                layouts_path=args.layouts,
+            ))
+        else:
+            play_interactive(
+                args.size, args.ansi, args.profile, args.log, args.ai, args.seed, args.pool, args.layouts,
+            )
+    finally:
+        if args.metrics:
+            metrics.REGISTRY.dump(args.metrics)
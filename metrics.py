@@ -0,0 +1,137 @@
+"""Счетчики и гистограммы для замеров внутри ядра игры.
+
+Пока ENABLED ложно, код ядра ничего не замеряет: каждая точка замера - это одна проверка флага.
+    import metrics
+    metrics.enable()
+    ...
+    metrics.REGISTRY.get("field.shoot.seconds").mean
+    metrics.REGISTRY.dump("metrics.json")
+"""
+import bisect
+import cProfile
+import json
+import math
+
+
+ENABLED = False
+
+# Верхние границы корзин гистограмм
+LATENCY_BUCKETS = tuple(m * 10.0 ** e for e in range(-7, 1) for m in (1, 2, 5)) + (10.0,)  # Секунды
+COUNT_BUCKETS = (1, 2, 5, 10, 15, 20, 25, 30, 40, 50, 75, 100, 200, 500, 1000, 2000, 5000, 10000, 20000)
+
+
+class Counter:
+    __slots__ = ("name", "value")
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def reset(self):
+        self.value = 0
+
+    def snapshot(self):
+        return {"type": "counter", "value": self.value}
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: counts[i] - кол-во значений не больше buckets[i],
+    но больше buckets[i - 1]; последний элемент counts - значения больше всех границ."""
+
+    __slots__ = ("name", "buckets", "counts", "count", "total")
+
+    def __init__(self, name, buckets):
+        self.name = name
+        self.buckets = tuple(buckets)
+        self.reset()
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def reset(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """Верхняя граница корзины, в которую попадает квантиль q."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, cnt in zip(self.buckets + (math.inf,), self.counts):
+            seen += cnt
+            if seen >= rank:
+                return bound
+        return math.inf
+
+    def snapshot(self):
+        return {
+            "type": "histogram",
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.mean,
+            "buckets": [[bound, cnt] for bound, cnt in zip(self.buckets + ("+inf",), self.counts)],
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.__metrics = {}
+
+    def counter(self, name):
+        return self.__register(name, Counter, name)
+
+    def histogram(self, name, buckets=LATENCY_BUCKETS):
+        return self.__register(name, Histogram, name, buckets)
+
+    def __register(self, name, cls, *args):
+        metric = self.__metrics.get(name)
+        if metric is None:
+            metric = self.__metrics[name] = cls(*args)
+        elif type(metric) is not cls:
+            raise ValueError(f"Метрика {name} уже зарегистрирована с другим типом.")
+        return metric
+
+    def get(self, name):
+        return self.__metrics[name]
+
+    def names(self):
+        return sorted(self.__metrics)
+
+    def reset(self):
+        for metric in self.__metrics.values():
+            metric.reset()
+
+    def snapshot(self):
+        return {name: self.__metrics[name].snapshot() for name in self.names()}
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+
+REGISTRY = MetricsRegistry()
+
+
+def enable(flag=True):
+    global ENABLED
+    ENABLED = bool(flag)
+
+
+def profile(func, path):
+    """Выполнить func() под cProfile и сохранить статистику в path (для pstats/snakeviz)."""
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func)
+    finally:
+        profiler.dump_stats(path)
@@ -1,9 +1,162 @@
-import copy
+import array
+import collections
+import functools
+import hashlib
+import os
 import random
+import time
 from enum import Enum
 
+import metrics
+
 
 SIZE = 6  # Размер поля
+FLEET = (3, 2, 2, 1, 1, 1, 1)  # Размеры кораблей на поле размером SIZE
+
+FIELD_SHOOT_SECONDS = metrics.REGISTRY.histogram("field.shoot.seconds")
+GENERATOR_FIELDS = metrics.REGISTRY.counter("generator.fields")
+GENERATOR_REJECTED_PLACEMENTS = metrics.REGISTRY.counter("generator.rejected_placements")
+GENERATOR_DEAD_ENDS = metrics.REGISTRY.counter("generator.dead_ends")
+
+
+def default_fleet(size):
+    """Флот для поля заданного размера.
+    До 10*10 - стандартный FLEET, на 10*10 - классический флот с четырехпалубником,
+    дальше самый длинный корабль растет вместе с полем,
+    а кораблей каждой длины на один больше, чем кораблей на палубу длиннее."""
+    if size < 10:
+        return FLEET
+    longest = 3 + (size + 10) // 20
+    return tuple(length for length in range(longest, 0, -1) for _ in range(longest - length + 1))
+
+
+def new_seed():
+    """Случайный 64-битный seed из энтропии ОС."""
+    return int.from_bytes(os.urandom(8), "little")
+
+
+def game_seed(master_seed, game_index):
+    """64-битный seed партии game_index из прогона с главным seed master_seed.
+    Seed партий получаются хэшированием, поэтому потоки случайных чисел разных партий не связаны между собой,
+    а любую партию можно воспроизвести по (master_seed, game_index), не проигрывая предыдущих."""
+    digest = hashlib.blake2b(f"{master_seed}:{game_index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def plural(n, one, few, many):
+    """Слово в форме, согласованной с числом n: plural(n, "корабль", "корабля", "кораблей")."""
+    if n % 10 == 1 and n % 100 != 11:
+        return one
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return few
+    return many
+
+
+def describe_fleet(fleet):
+    """Описание флота вида "1 корабль на 3 клетки, 2 корабля на 2 клетки и 4 корабля на 1 клетку"."""
+    counts = sorted(collections.Counter(fleet).items(), reverse=True)
+    parts = [
+        f"{cnt} {plural(cnt, 'корабль', 'корабля', 'кораблей')} на {size} "
+        f"{plural(size, 'клетку', 'клетки', 'клеток')}"
+        for size, cnt in counts
+    ]
+    return parts[0] if len(parts) == 1 else ", ".join(parts[:-1]) + " и " + parts[-1]
+
+
+def cell_bit(x, y, size):
+    """Бит клетки (x, y) в маске поля размером size."""
+    return 1 << ((x - 1) * size + y - 1)
+
+
+@functools.lru_cache(maxsize=None)
+def board_masks(size):
+    """Маски всего поля и всех колонок, кроме первой и кроме последней."""
+    full = (1 << size * size) - 1
+    first_col = sum(1 << (i * size) for i in range(size))
+    last_col = first_col << (size - 1)
+    return full, full & ~first_col, full & ~last_col
+
+
+def neighbourhood_mask(mask, size):
+    """Клетки mask вместе со всеми соприкасающимися с ними клетками (в том числе по диагонали)."""
+    full, not_first_col, not_last_col = board_masks(size)
+    row = mask | (mask & not_last_col) << 1 | (mask & not_first_col) >> 1
+    return (row | row << size | row >> size) & full
+
+
+@functools.lru_cache(maxsize=None)
+def symmetry_tables(size):
+    """Таблицы для поворотов и отражений маски поля: 7 преобразований квадрата, кроме тождественного.
+    Для каждого преобразования и каждого байта маски - образы всех 256 значений этого байта."""
+    n = size - 1
+    transforms = (
+        lambda x, y: (y, n - x),
+        lambda x, y: (n - x, n - y),
+        lambda x, y: (n - y, x),
+        lambda x, y: (x, n - y),
+        lambda x, y: (n - x, y),
+        lambda x, y: (y, x),
+        lambda x, y: (n - y, n - x),
+    )
+    cells = size * size
+    tables = []
+    for transform in transforms:
+        byte_tables = []
+        for byte in range((cells + 7) // 8):
+            images = [0] * 8
+            for k in range(8):
+                i = byte * 8 + k
+                if i < cells:
+                    tx, ty = transform(*divmod(i, size))
+                    images[k] = 1 << (tx * size + ty)
+            table = [0] * 256
+            for value in range(1, 256):
+                low = value & -value
+                table[value] = table[value ^ low] | images[low.bit_length() - 1]
+            byte_tables.append(table)
+        tables.append(tuple(byte_tables))
+    return tuple(tables)
+
+
+def canonical_masks(masks, size):
+    """Наименьший из образов кортежа масок при поворотах и отражениях поля:
+    у симметричных друг другу позиций он один и тот же."""
+    best = masks
+    for byte_tables in symmetry_tables(size):
+        image = []
+        for mask in masks:
+            out = 0
+            for table in byte_tables:
+                if not mask:
+                    break
+                out |= table[mask & 0xFF]
+                mask >>= 8
+            image.append(out)
+        image = tuple(image)
+        if image < best:
+            best = image
+    return best
+
+
+@functools.lru_cache(maxsize=None)
+def zobrist_keys(size):
+    """Случайные 64-битные ключи клеток для хэша видимой противнику доски: (подбитая палуба, обводка, промах).
+    Ключи зависят только от размера поля, поэтому хэши совпадают между запусками и процессами."""
+    rng = random.Random(size)
+    return tuple(tuple(rng.getrandbits(64) for _ in range(size * size)) for _ in range(3))
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def zobrist_xor(size, mask, kind):
+    """XOR ключей zobrist_keys(size)[kind] всех клеток mask.
+    Кэшируется: обводки кораблей одних и тех же размещений повторяются от партии к партии."""
+    keys = zobrist_keys(size)[kind]
+    out = 0
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        out ^= keys[bit.bit_length() - 1]
+    return out
 
 
 class SeaBattleException(Exception):
@@ -24,11 +177,13 @@ class ShootResult(Enum):
 
 
 class Dot:
+    __slots__ = ("__x", "__y")
+
     def __init__(self, x, y):
-        self.__x = None
-        self.__y = None
-        self.x = x
-        self.y = y
+        self.check_coord(x)
+        self.check_coord(y)
+        self.__x = x
+        self.__y = y
 
     @property
     def x(self):
@@ -74,9 +229,169 @@ class Dot:
         return self.x == other.x and self.y == other.y
 
 
+class Cell(Dot):
+    """Неизменяемая клетка поля.
+    На каждый размер поля для каждой клетки создается ровно один объект: Cell.at и Cell.grid
+    возвращают уже созданные объекты, поэтому клетки можно сравнивать через is и хранить в множествах."""
+
+    __slots__ = ("__size", "__index")
+    __grids = {}  # Размер поля -> все клетки поля по порядку номеров
+
+    x = property(Dot.x.fget)
+    y = property(Dot.y.fget)
+
+    def __init__(self, x, y, size=SIZE):
+        raise TypeError("Используйте Cell.at(x, y, size) или Cell.grid(size).")
+
+    @staticmethod
+    def grid(size=SIZE):
+        """Все клетки поля размером size по строкам: номер клетки (x - 1) * size + y - 1."""
+        cells = Cell.__grids.get(size)
+        if cells is None:
+            cells = []
+            for x in range(1, size + 1):
+                for y in range(1, size + 1):
+                    cell = object.__new__(Cell)
+                    cell._Dot__x = x
+                    cell._Dot__y = y
+                    cell.__size = size
+                    cell.__index = len(cells)
+                    cells.append(cell)
+            cells = Cell.__grids[size] = tuple(cells)
+        return cells
+
+    @staticmethod
+    def at(x, y, size=SIZE):
+        Dot.check_coord(x)
+        Dot.check_coord(y)
+        if x > size or y > size:
+            raise SeaBattleException("Точка выходит за пределы поля.")
+        return Cell.grid(size)[(x - 1) * size + y - 1]
+
+    @property
+    def size(self):
+        return self.__size
+
+    @property
+    def index(self):
+        """Номер клетки, он же номер ее бита в масках поля."""
+        return self.__index
+
+    def __hash__(self):
+        return hash((self.x, self.y))
+
+    def __repr__(self):
+        return f"Cell({self.x}, {self.y}, size={self.size})"
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return Cell.at, (self.x, self.y, self.size)
+
+
+class CellPool:
+    """Набор клеток поля, из которого за O(1) берется случайная клетка, удаляется и проверяется любая клетка.
+    Клетки лежат в списке, а номер клетки -> ее позиция в списке хранится отдельно:
+    на место удаленной клетки переносится последняя. После первого snapshot удаления пишутся в журнал,
+    и restore возвращает их в обратном порядке, восстанавливая и порядок клеток в списке."""
+
+    __slots__ = ("size", "__cells", "__pos", "__journal")
+
+    def __init__(self, size=SIZE, cells=None):
+        """
+        :param cells: клетки Cell поля размером size; по умолчанию все клетки поля
+        """
+        self.size = size
+        self.__cells = list(Cell.grid(size) if cells is None else cells)
+        self.__pos = [-1] * (size * size)
+        for i, cell in enumerate(self.__cells):
+            self.__pos[cell.index] = i
+        self.__journal = None  # (клетка, ее позиция) каждого удаления; None - пока не было snapshot
+
+    def __len__(self):
+        return len(self.__cells)
+
+    def __iter__(self):
+        return iter(self.__cells)
+
+    def __contains__(self, cell):
+        return self.__pos[cell.index] >= 0
+
+    def has_index(self, index):
+        return self.__pos[index] >= 0
+
+    def discard(self, cell):
+        """Убрать клетку, если она есть.
+        :return: True если клетка была
+        """
+        index = cell.index
+        i = self.__pos[index]
+        if i < 0:
+            return False
+        last = self.__cells.pop()
+        if last is not cell:
+            self.__cells[i] = last
+            self.__pos[last.index] = i
+        self.__pos[index] = -1
+        if self.__journal is not None:
+            self.__journal.append((cell, i))
+        return True
+
+    def snapshot(self):
+        """Метка состояния для restore: глубина журнала удалений."""
+        if self.__journal is None:
+            self.__journal = []
+        return len(self.__journal)
+
+    def restore(self, snapshot):
+        """Вернуть клетки, удаленные после snapshot. Снимки, снятые позже snapshot, после этого недействительны."""
+        journal = self.__journal
+        if journal is None or snapshot > len(journal):
+            raise SeaBattleException("Снимок снят не с этого состояния.")
+        cells, pos = self.__cells, self.__pos
+        while len(journal) > snapshot:
+            cell, i = journal.pop()
+            if i < len(cells):
+                moved = cells[i]
+                pos[moved.index] = len(cells)
+                cells.append(moved)
+                cells[i] = cell
+            else:
+                cells.append(cell)
+            pos[cell.index] = i
+
+    def pop_random(self, rng=random):
+        cell = self.__cells[rng.randrange(len(self.__cells))]
+        self.discard(cell)
+        return cell
+
+    def neighbours(self, cell):
+        """Клетки набора, соседние с cell по вертикали и горизонтали, по порядку номеров."""
+        size = self.size
+        x, y = cell.x, cell.y
+        index = cell.index
+        grid = Cell.grid(size)
+        candidates = []
+        if x > 1:
+            candidates.append(index - size)
+        if y > 1:
+            candidates.append(index - 1)
+        if y < size:
+            candidates.append(index + 1)
+        if x < size:
+            candidates.append(index + size)
+        return [grid[i] for i in candidates if self.__pos[i] >= 0]
+
+
 class ShipPart(Dot):
     """Палуба корабля."""
 
+    __slots__ = ("alive",)
+
     def __init__(self, x, y):
         super(ShipPart, self).__init__(x, y)
         self.alive = True
@@ -85,6 +400,34 @@ class ShipPart(Dot):
         return f"Палуба ({self.x},{self.y}) " + "целая." if self.alive else "подбита."
 
 
+class ShipPartView:
+    """Палуба корабля только для чтения: показывает текущее состояние палубы, но не дает его менять."""
+
+    __slots__ = ("__part",)
+
+    def __init__(self, part):
+        self.__part = part
+
+    @property
+    def x(self):
+        return self.__part.x
+
+    @property
+    def y(self):
+        return self.__part.y
+
+    @property
+    def alive(self):
+        return self.__part.alive
+
+    get_direction = Dot.get_direction
+    near_with = Dot.near_with
+    __eq__ = Dot.__eq__
+
+    def __str__(self):
+        return self.__part.__str__()
+
+
 class Ship:
     """Корабль."""
 
@@ -95,6 +438,7 @@ class Ship:
 
         self.__direction = ShipDirection.empty
         self.__parts = []
+        self.__parts_view = ()
         for part in ship_parts:
             self.add_part(part)
 
@@ -104,8 +448,8 @@ class Ship:
 
     @property
     def ship_parts(self):
-        # Не даем изменять палубы корабля напрямую, поэтому возвращаем копию
-        return copy.deepcopy(self.__parts)
+        # Не даем изменять палубы корабля напрямую, поэтому возвращаем палубы только для чтения
+        return self.__parts_view
 
     def add_part(self, part):
         if part in self.__parts:
@@ -132,6 +476,7 @@ class Ship:
                     break
         if can_add:
             self.__parts.append(part)
+            self.__parts_view += (ShipPartView(part),)
         else:
             raise SeaBattleException("Палуба не соприкасается с уже имеющимися на корабле,"
                                      " либо содержит неверное направление")
@@ -143,6 +488,12 @@ class Ship:
                 return ShootResult.injure if self.is_alive else ShootResult.killed
         return ShootResult.missed
 
+    def repair(self, dot):
+        """Снова сделать палубу целой: нужно, чтобы отменять выстрелы."""
+        for p in self.__parts:
+            if p == dot:
+                p.alive = True
+
     @property
     def size(self):
         return len(self.__parts)
@@ -152,7 +503,7 @@ class Ship:
         return any(p.alive for p in self.__parts)
 
     def __eq__(self, other):
-        return self.__parts == other.__parts
+        return list(self.ship_parts) == list(other.ship_parts)
 
     def __str__(self):
         return "Корабль со следующими палубами:\n" + "\n".join(p.__str__() for p in self.__parts)
@@ -160,25 +511,65 @@ class Ship:
     def compatible_with(self, other):
         """Проверка возможности размещения вместе с кораблем other на одном поле."""
         for p in self.__parts:
-            for other_p in other.__parts:
+            for other_p in other.ship_parts:
                 if abs(p.x - other_p.x) <= 1 and abs(p.y - other_p.y) <= 1:
                     return False
         return True
 
     def remove_near_dots(self, available_dots):
-        # Все точки вокруг корабля надо убрать из available_dots
-        to_remove = []
-        for d in available_dots:
-            for p in self.ship_parts:
-                if d.near_with(p):
-                    to_remove.append(d)
-                    break
-        for d in to_remove:
-            available_dots.remove(d)
+        """Убрать из available_dots (CellPool) все клетки корабля и вокруг него.
+        Обходится только окрестность корабля, а не весь набор."""
+        size = available_dots.size
+        grid = Cell.grid(size)
+        for p in self.__parts:
+            for x in range(max(p.x - 1, 1), min(p.x + 1, size) + 1):
+                for y in range(max(p.y - 1, 1), min(p.y + 1, size) + 1):
+                    available_dots.discard(grid[(x - 1) * size + y - 1])
+
+
+class ShipView:
+    """Корабль только для чтения: все, кроме добавления палуб и стрельбы."""
+
+    __slots__ = ("__ship",)
+
+    def __init__(self, ship):
+        self.__ship = ship
+
+    @property
+    def direction(self):
+        return self.__ship.direction
+
+    @property
+    def ship_parts(self):
+        return self.__ship.ship_parts
+
+    @property
+    def size(self):
+        return self.__ship.size
+
+    @property
+    def is_alive(self):
+        return self.__ship.is_alive
+
+    def compatible_with(self, other):
+        return self.__ship.compatible_with(other)
+
+    def remove_near_dots(self, available_dots):
+        self.__ship.remove_near_dots(available_dots)
+
+    __eq__ = Ship.__eq__
+
+    def __str__(self):
+        return self.__ship.__str__()
 
 
 class Field:
-    """Игровое поле."""
+    """Игровое поле.
+
+    Состояние поля хранится в целочисленных битовых масках: бит с номером (x - 1) * size + (y - 1)
+    соответствует клетке (x, y). Доска для вывода строится из масок по запросу.
+    Номер клетки -> номер корабля хранится в словаре, поэтому выстрел, проверка размещения и обводка
+    убитого корабля обходятся размером одного корабля, а не всего флота."""
 
     EMPTY_CELL = chr(0x25A1)
     CELL_SHOOTED = chr(0x25E6)
@@ -186,11 +577,33 @@ class Field:
     SHIP_CELL_ALIVE = chr(0x25A0)
     SHIP_CELL_KILLED = "x"
 
-    def __init__(self, *ships, size=SIZE):
-        random.seed()
+    def __init__(self, *ships, size=SIZE, fleet=FLEET, rng=None):
+        """
+        :param ships: корабли
+        :param size: размер поля
+        :param fleet: размеры всех кораблей, которые должны быть на поле
+        :param rng: random.Random для rnd_coords; по умолчанию общий генератор модуля random
+        """
+        self.__rng = rng  # None, а не модуль random: модуль не сериализуется, а поля передаются между процессами
         self.__size = size
-        self.__init_board()
+        self.__fleet = tuple(fleet)
+        self.__fleet_limits = collections.Counter(fleet)  # Размер корабля -> сколько таких может быть
+        self.__ships_by_size = collections.Counter()
         self.__ships = []
+        self.__ship_views = []  # ShipView каждого корабля, в том же порядке, что и __ships
+        self.__ship_masks = []  # Маска каждого корабля, в том же порядке, что и __ships
+        self.__ship_halos = []  # Маска каждого корабля вместе с окрестностью
+        self.__cell_ship = {}  # Номер клетки -> номер корабля в __ships
+        self.__forbidden = 0  # Клетки, где нельзя ставить новый корабль: корабли с окрестностью
+        self.__cells_left = 0  # Кол-во целых палуб
+        self.__occupied = 0  # Клетки, занятые кораблями
+        self.__hit = 0  # Подбитые палубы
+        self.__missed = 0  # Выстрелы мимо
+        self.__contoured = 0  # Клетки вокруг убитых кораблей
+        self.__hash = 0  # Хэш Зобриста видимой противнику доски, см. position_hash
+        self.__hit_keys, self.__contour_keys, self.__miss_keys = zobrist_keys(size)
+        self.__revision = 0  # Растет при каждом изменении клеток поля
+        self.__row_revisions = [0] * (size + 1)  # Ревизия последнего изменения каждой строки, с 1
         for s in ships:
             self.add_ship(s)
 
@@ -198,49 +611,86 @@ class Field:
     def size(self):
         return self.__size
 
+    @property
+    def fleet(self):
+        return self.__fleet
+
     @property
     def ships(self):
         # Не даем менять напрямую
-        for s in self.__ships:
-            yield copy.deepcopy(s)
+        yield from self.__ship_views
 
-    def __init_board(self):
-        """Пустое пронумерованное поле."""
-        self.__board = [[" "] + list(map(str, range(1, self.size + 1)))]  # Номера колонок
-        for i in range(1, self.size + 1):
-            line = [str(i)] + [Field.EMPTY_CELL for _ in range(self.size)]
-            self.__board.append(line)
+    def __index(self, dot):
+        return (dot.x - 1) * self.size + dot.y - 1
+
+    def __bit(self, dot):
+        return cell_bit(dot.x, dot.y, self.size)
+
+    def __ship_mask(self, ship: Ship):
+        mask = 0
+        for p in ship.ship_parts:
+            mask |= self.__bit(p)
+        return mask
+
+    def __ship_at(self, ship: Ship):
+        """Номер корабля поля, занимающего те же клетки, что и ship, либо None."""
+        parts = ship.ship_parts
+        if not parts:
+            return None
+        i = self.__cell_ship.get(self.__index(parts[0]))
+        if i is None or self.__ship_masks[i] != self.__ship_mask(ship):
+            return None
+        return i
+
+    def __neighbour_ship(self, ship: Ship):
+        """Номер любого корабля поля, соприкасающегося с ship."""
+        for p in ship.ship_parts:
+            for x in range(p.x - 1, p.x + 2):
+                for y in range(p.y - 1, p.y + 2):
+                    if 0 < x <= self.size and 0 < y <= self.size:
+                        i = self.__cell_ship.get((x - 1) * self.size + y - 1)
+                        if i is not None:
+                            return i
+        return None
 
     def add_ship(self, ship: Ship):
-        if ship in self.__ships:
+        # Маску считаем только для корабля внутри поля, иначе биты "перетекут" на соседние строки
+        is_out = self.ship_out(ship)
+        mask = 0 if is_out else self.__ship_mask(ship)
+        if mask and self.__ship_at(ship) is not None:
             raise SeaBattleException("Такой корабль уже есть на поле.")
 
         ship_size = ship.size
         # Проверка кол-ва кораблей по размеру (кол-ву палуб)
-        ships_cnt_with_eq_size = len(["" for s in self.__ships if s.size == ship_size])
-        if ship_size == 3:
-            if ships_cnt_with_eq_size == 1:
-                raise SeaBattleException("Трехпалубник может быть только один.")
-        elif ship_size == 2:
-            if ships_cnt_with_eq_size == 2:
-                raise SeaBattleException("Двухпалубников может быть только два.")
-        elif ship_size == 1:
-            if ships_cnt_with_eq_size == 4:
-                raise SeaBattleException("Однопалубников может быть только четыре.")
-        else:
+        limit = self.__fleet_limits[ship_size]
+        if not limit:
             raise SeaBattleException(f"Корабля размером в {ship_size} палуб не может быть.")
+        if self.__ships_by_size[ship_size] == limit:
+            raise SeaBattleException(
+                f"Кораблей размером в {ship_size} палуб может быть только {limit}."
+            )
 
         # Проверка координат корабля
-        if self.ship_out(ship):
+        if is_out:
             raise SeaBattleException("Корабль  выходит за размеры поля.")
-        for s in self.__ships:
-            if not s.compatible_with(ship):
-                raise SeaBattleException(f"{ship} \nне может быть размещен вместе с кораблем ниже.\n{s}")
+        if mask & self.__forbidden:
+            s = self.__ships[self.__neighbour_ship(ship)]
+            raise SeaBattleException(f"{ship} \nне может быть размещен вместе с кораблем ниже.\n{s}")
 
         # Если нигде не бросили исключение, то можно добавлять корабль на поле
+        halo = neighbourhood_mask(mask, self.size)
+        i = len(self.__ships)
         self.__ships.append(ship)
+        self.__ship_views.append(ShipView(ship))
+        self.__ships_by_size[ship_size] += 1
+        self.__ship_masks.append(mask)
+        self.__ship_halos.append(halo)
         for p in ship.ship_parts:
-            self.__board[p.x][p.y] = Field.SHIP_CELL_ALIVE
+            self.__cell_ship[self.__index(p)] = i
+            self.__touch_rows(p.x, p.x)
+        self.__forbidden |= halo
+        self.__cells_left += ship_size
+        self.__occupied |= mask
 
     def out(self, dot):
         return dot.x > self.size or dot.y > self.size
@@ -252,159 +702,428 @@ class Field:
         return False
 
     def all_ships_exist(self):
-        ship_sizes = [3, 2, 2, 1, 1, 1, 1]
-        for s in self.__ships:
-            ship_sizes.remove(s.size)
-        return len(ship_sizes) == 0
+        return self.__ships_by_size == self.__fleet_limits
 
     def shoot(self, dot):
+        if not metrics.ENABLED:
+            return self.__shoot(dot)
+        started = time.perf_counter()
+        try:
+            return self.__shoot(dot)
+        finally:
+            FIELD_SHOOT_SECONDS.observe(time.perf_counter() - started)
+
+    def __shoot(self, dot):
         if self.out(dot):
             raise SeaBattleException("Точка выходит за пределы поля.")
-        for s in self.__ships:
-            res = s.shoot(dot)
-            if res != ShootResult.missed:
-                self.__board[dot.x][dot.y] = Field.SHIP_CELL_KILLED
-                if res == ShootResult.killed:
-                    self.contour_killed_ship(s)
-                return res
-        self.__board[dot.x][dot.y] = Field.CELL_SHOOTED
+        index = self.__index(dot)
+        i = self.__cell_ship.get(index)
+        bit = 1 << index
+        self.__touch_rows(dot.x, dot.x)
+        if i is not None:
+            if not bit & self.__hit:
+                self.__hit |= bit
+                self.__cells_left -= 1
+                self.__hash ^= self.__hit_keys[index]
+            self.__ships[i].shoot(dot)  # Синхронизируем состояние палуб корабля
+            if self.__ship_masks[i] & ~self.__hit:
+                return ShootResult.injure
+            self.__contour(i)
+            return ShootResult.killed
+        if bit & self.__contoured or not bit & self.__missed:
+            # Клетка была обведена либо еще не обстреляна, а становится промахом
+            self.__hash ^= self.__miss_keys[index]
+            if bit & self.__contoured:
+                self.__hash ^= self.__contour_keys[index]
+        self.__missed |= bit
+        self.__contoured &= ~bit  # Повторный выстрел по обведенной клетке показываем как промах
         return ShootResult.missed
 
+    def __contour(self, i):
+        self.__add_contour(self.__ship_halos[i] & ~self.__ship_masks[i])
+        rows = [p.x for p in self.__ships[i].ship_parts]
+        self.__touch_rows(min(rows) - 1, max(rows) + 1)
+
+    def __add_contour(self, mask):
+        already = mask & self.__contoured
+        self.__hash ^= zobrist_xor(self.size, mask, 1)
+        if already:
+            self.__hash ^= zobrist_xor(self.size, already, 1)
+        covered_misses = mask & ~self.__contoured & self.__missed  # Обводка закрывает промах
+        if covered_misses:
+            self.__hash ^= zobrist_xor(self.size, covered_misses, 2)
+        self.__contoured |= mask
+
     def contour_killed_ship(self, s: Ship):
-        coords = [Dot(p.x, p.y) for p in s.ship_parts]
-        for i in range(1, self.size + 1):
-            for j in range(1, self.size + 1):
-                for c in coords:
-                    d = Dot(i, j)
-                    if d not in coords and d.near_with(c):
-                        self.__board[i][j] = Field.CELL_CONTOURED
+        i = self.__ship_at(s)
+        if i is not None:
+            self.__contour(i)
+        elif s.size:
+            mask = self.__ship_mask(s)
+            self.__add_contour(neighbourhood_mask(mask, self.size) & ~mask)
+            rows = [p.x for p in s.ship_parts]
+            self.__touch_rows(min(rows) - 1, max(rows) + 1)
+
+    @property
+    def occupied(self):
+        """Маска клеток всех кораблей."""
+        return self.__occupied
+
+    @property
+    def position_hash(self):
+        """Хэш Зобриста видимой противнику доски: подбитые палубы, обводка и промахи.
+        Обновляется при каждом выстреле, поэтому позиции можно кэшировать по нему без обхода доски."""
+        return self.__hash
+
+    def snapshot(self):
+        """Состояние выстрелов по полю, которое можно вернуть через restore. Корабли не копируются."""
+        return self.__hit, self.__missed, self.__contoured, self.__cells_left, self.__hash
+
+    def restore(self, snapshot):
+        """Вернуть поле к состоянию snapshot, снятому с этого же поля.
+        Обходятся только клетки, которые с тех пор изменились."""
+        hit, missed, contoured, cells_left, position_hash = snapshot
+        changed_hits = hit ^ self.__hit
+        changed = changed_hits | missed ^ self.__missed | contoured ^ self.__contoured
+        while changed_hits:
+            bit = changed_hits & -changed_hits
+            changed_hits ^= bit
+            x, y = divmod(bit.bit_length() - 1, self.size)
+            ship = self.__ships[self.__cell_ship[x * self.size + y]]
+            if bit & hit:
+                ship.shoot(Dot(x + 1, y + 1))
+            else:
+                ship.repair(Dot(x + 1, y + 1))
+        self.__hit, self.__missed, self.__contoured = hit, missed, contoured
+        self.__cells_left = cells_left
+        self.__hash = position_hash
+        rows = set()
+        while changed:
+            bit = changed & -changed
+            changed ^= bit
+            rows.add((bit.bit_length() - 1) // self.size + 1)
+        for x in rows:
+            self.__touch_rows(x, x)
+
+    def __touch_rows(self, first, last):
+        """Отметить строки с first по last (с 1) как измененные."""
+        self.__revision += 1
+        for x in range(max(first, 1), min(last, self.size) + 1):
+            self.__row_revisions[x] = self.__revision
+
+    @property
+    def revision(self):
+        """Номер последнего изменения клеток поля."""
+        return self.__revision
+
+    def row_revision(self, x):
+        """Номер последнего изменения клеток строки x (с 1)."""
+        return self.__row_revisions[x]
 
     @property
     def has_alive_ships(self):
-        return any([s.is_alive for s in self.ships])
+        return self.__cells_left > 0
+
+    def __cell_char(self, bit, hidden):
+        if bit & self.__hit:
+            return Field.SHIP_CELL_KILLED
+        if bit & self.__occupied:
+            return Field.EMPTY_CELL if hidden else Field.SHIP_CELL_ALIVE
+        if bit & self.__contoured:
+            return Field.CELL_CONTOURED
+        if bit & self.__missed:
+            return Field.CELL_SHOOTED
+        return Field.EMPTY_CELL
+
+    def row(self, x, hidden=False):
+        """Символы клеток строки x (с 1).
+        :param hidden: скрыть целые палубы (вид для противника)
+        """
+        bit = cell_bit(x, 1, self.size)
+        cells = []
+        for _ in range(self.size):
+            cells.append(self.__cell_char(bit, hidden))
+            bit <<= 1
+        return cells
+
+    def board(self, hidden=False):
+        """Пронумерованная доска в виде списка строк из символов клеток.
+        :param hidden: скрыть целые палубы (вид для противника)
+        """
+        board = [[" "] + list(map(str, range(1, self.size + 1)))]  # Номера колонок
+        for i in range(1, self.size + 1):
+            board.append([str(i)] + self.row(i, hidden))
+        return board
 
     def show_position(self, hidden=False):
-        for row in self.__board:
-            for v in row:
-                if hidden:
-                    if v == Field.SHIP_CELL_ALIVE:
-                        v = Field.EMPTY_CELL
-                    print(f"{v:2s}", end="")
-                else:
-                    print(f"{v:2s}", end="")
-            print()
+        width = len(str(self.size)) + 1  # Номера строк больше 9 не должны слипаться с клетками
+        print("\n".join(
+            row[0].ljust(width) + "".join(f"{v:2s}" for v in row[1:]) for row in self.board(hidden)
+        ))
 
-    @staticmethod
-    def rnd_coords():
-        v = random.randint(0, SIZE * SIZE - 1)
-        x = v // SIZE
-        y = v - x * SIZE
+    def rnd_coords(self):
+        v = (self.__rng or random).randint(0, self.size * self.size - 1)
+        x = v // self.size
+        y = v - x * self.size
         return x + 1, y + 1  # Координаты начинаются с 1, а не 0
 
     @staticmethod
-    def read_player_field():
+    def read_player_field(size=SIZE, fleet=FLEET):
         print(
-            "Введите координаты кораблей. Должен быть указан 1 трехпалубный корабль, 2 двухпалубных и 4 однопалубных.",
-            "\nПример кораблей:",
-            "1,1 1,2 1,3; 4,2 4,3; 6,1 6,2; 1,5; 3,6; 6,4; 6,6"
-            f"\nКаждая палуба задается парой чисел от 1 до {SIZE}, разделенных запятой: сначала срока, а затем столбец.",
+            f"Введите координаты кораблей. Должно быть указано {describe_fleet(fleet)}.",
+            *(
+                ["\nПример кораблей:", "1,1 1,2 1,3; 4,2 4,3; 6,1 6,2; 1,5; 3,6; 6,4; 6,6"]
+                if size == SIZE and tuple(fleet) == FLEET else []
+            ),
+            f"\nКаждая палуба задается парой чисел от 1 до {size}, разделенных запятой: сначала срока, а затем столбец.",
             "\nКоординаты палуб отделяются друг от друга пробелами.",
             "\nОписание всех палуб корабля нужно завершить точкой с запятой.",
         )
         while True:
             try:
-                field = Field()
-                ships_str = input()
-                # ships_str = "1,1 1,2 1,3; 4,2 4,3; 6,1 6,2; 1,5; 3,6; 6,4; 6,6"
-                for ship_raw in ships_str.split(";"):
-                    ship = Ship()
-                    for coords in ship_raw.strip().split():
-                        ship.add_part(
-                            ShipPart(
-                                *tuple(
-                                    map(int, coords.split(","))
-                                )
-                            )
-                        )
-                    field.add_ship(ship)
-                if not field.all_ships_exist():
-                    raise SeaBattleException("Не заданы все корабли.")
-                return field
+                return Field.parse_layout(input(), size, fleet)
             except Exception as e:
                 print("Ошибка парсинга координат.")
                 if type(e) is SeaBattleException:
                     print(e)
                 print("Попробуйте ввести их еще раз.")
 
+    @staticmethod
+    def parse_layout(ships_str, size=SIZE, fleet=FLEET):
+        """Поле по строке с кораблями вида "1,1 1,2 1,3; 4,2 4,3; 6,1 6,2; 1,5; 3,6; 6,4; 6,6".
+        Бросает SeaBattleException, если корабли заданы неверно, и ValueError/TypeError, если строку не разобрать.
+        """
+        field = Field(size=size, fleet=fleet)
+        for ship_raw in ships_str.split(";"):
+            ship = Ship()
+            for coords in ship_raw.strip().split():
+                ship.add_part(
+                    ShipPart(
+                        *tuple(
+                            map(int, coords.split(","))
+                        )
+                    )
+                )
+            field.add_ship(ship)
+        if not field.all_ships_exist():
+            raise SeaBattleException("Не заданы все корабли.")
+        return field
+
+
+class ShipPlacements:
+    """Все варианты размещения корабля размером ship_size на поле размером size.
+
+    Вариант хранится как номер клетки первой палубы и признак вертикального корабля. Маска корабля и маска
+    вместе с окрестностью получаются сдвигом шаблона, общего для всех вариантов с тем же направлением
+    (у окрестности - и с той же колонкой), поэтому память - O(кол-во вариантов), а не O(вариантов * клеток)."""
+
+    def __init__(self, size, ship_size):
+        self.size = size
+        self.ship_size = ship_size
+        self.__full = (1 << size * size) - 1
+        self.__starts = array.array("I")  # Номер клетки первой палубы каждого варианта
+        self.__vertical = bytearray()  # 1 у вертикальных вариантов
+        directions = [0] if ship_size == 1 else [0, 1]
+        for x in range(size):
+            for y in range(size):
+                for vertical in directions:
+                    if (x if vertical else y) + ship_size > size:
+                        continue
+                    self.__starts.append(x * size + y)
+                    self.__vertical.append(vertical)
+        self.__steps = (1, size)  # Шаг между палубами горизонтального и вертикального корабля
+        self.__shapes = tuple(sum(1 << (c * step) for c in range(ship_size)) for step in self.__steps)
+        # Окрестность корабля, первая палуба которого в колонке y, начиная со строки над ним: [vertical][y]
+        self.__halo_shapes = tuple(
+            tuple(self.__halo_shape(ship_size if vertical else 1, 1 if vertical else ship_size, y) for y in range(size))
+            for vertical in (0, 1)
+        )
+
+    def __halo_shape(self, rows, cols, y):
+        first, last = max(y - 1, 0), min(y + cols, self.size - 1)
+        row = ((1 << (last - first + 1)) - 1) << first
+        return sum(row << (r * self.size) for r in range(rows + 2))
+
+    def __len__(self):
+        return len(self.__starts)
+
+    def mask(self, i):
+        """Маска корабля i-го варианта."""
+        return self.__shapes[self.__vertical[i]] << self.__starts[i]
+
+    def halo(self, i):
+        """Маска корабля i-го варианта вместе с окрестностью."""
+        x, y = divmod(self.__starts[i], self.size)
+        shape = self.__halo_shapes[self.__vertical[i]][y]
+        return (shape << (x - 1) * self.size if x else shape >> self.size) & self.__full
+
+    def cell_indexes(self, i):
+        """Номера клеток палуб i-го варианта."""
+        start, step = self.__starts[i], self.__steps[self.__vertical[i]]
+        return tuple(range(start, start + step * self.ship_size, step))
+
+    def cells(self, i):
+        """Координаты палуб i-го варианта."""
+        return tuple((c // self.size + 1, c % self.size + 1) for c in self.cell_indexes(i))
+
+    def __getitem__(self, i):
+        """(маска корабля, маска вместе с окрестностью, координаты палуб) i-го варианта."""
+        return self.mask(i), self.halo(i), self.cells(i)
+
+
+@functools.lru_cache(maxsize=None)
+def ship_placements(size, ship_size):
+    """Варианты размещения корабля размером ship_size на поле размером size: ShipPlacements."""
+    return ShipPlacements(size, ship_size)
+
+
+@functools.lru_cache(maxsize=None)
+def ship_placement_cells(size, ship_size):
+    """Номера клеток ((x - 1) * size + y - 1) вариантов из ship_placements.
+    :return: (номера клеток каждого варианта, номера вариантов, накрывающих каждую клетку)
+    """
+    placements = ship_placements(size, ship_size)
+    cells = tuple(placements.cell_indexes(i) for i in range(len(placements)))
+    covering = [[] for _ in range(size * size)]
+    for i, placement_cells in enumerate(cells):
+        for c in placement_cells:
+            covering[c].append(i)
+    return cells, tuple(tuple(c) for c in covering)
+
 
 class FieldGenerator:
-    def __init__(self, field_size=SIZE, ship_sizes=[3, 2, 2, 1, 1, 1, 1], max_tries=1000):
-        self.__ship_sizes = ship_sizes.copy()
+    SAMPLE_TRIES = 8  # Сколько случайных вариантов проверить, прежде чем перебрать все
+
+    def __init__(self, field_size=SIZE, ship_sizes=FLEET, max_tries=1000, layouts=None, rng=None):
+        """
+        :param field_size: размер поля
+        :param ship_sizes: размеры кораблей в порядке их размещения
+        :param max_tries: сколько раз можно зайти в тупик, прежде чем сдаться
+        :param layouts: layout_table.LayoutTable для этого поля и флота; с ней поле - случайная строка таблицы,
+                        а все расстановки равновероятны (при последовательном размещении это не так)
+        :param rng: random.Random, из которого берутся все случайные выборы генератора;
+                    по умолчанию общий генератор модуля random
+        """
+        if layouts is not None and not layouts.matches(field_size, ship_sizes):
+            raise SeaBattleException("Таблица расстановок не подходит для этого поля и флота.")
+        self.__ship_sizes = list(ship_sizes)
         self.field_size = field_size
-        self.__available_dots_for_ships = []
         self.__max_tries = max_tries
-        self.__field = Field()
+        self.layouts = layouts
+        self.__rng = rng  # Как в Field: модуль random не храним, чтобы генератор и его поля сериализовались
+        self.rejected_placements = 0  # Сколько вариантов размещения отброшено при последней генерации
+        self.dead_ends = 0  # Сколько раз при последней генерации для корабля не нашлось места
+        self.total_rejected_placements = 0  # То же, что rejected_placements, но за все время жизни генератора
 
-    def __reset_available_dots_for_ships(self):
-        self.__available_dots_for_ships = []
-        for i in range(1, self.field_size + 1):
-            for j in range(1, self.field_size + 1):
-                self.__available_dots_for_ships.append(Dot(i, j))
+    @property
+    def rng(self):
+        return self.__rng or random
 
     def generate_rnd_field(self):
-        """Алгорим не оптимальный вообще ни разу.
-        Генерируем поле последовательно: корабль за кораблем.
-        На каждый размер корабля сначала  определяем список из возможных его размещений.
-        Выбираем рандомный вариант, а если список путой, то начинаем генерировать поля с нуля.
-        Таких попыток может быть max_tries итераций. Если не смогли сгенерировать, то брасаем исключение."""
-        try_cnt = 0
-        while True:
-            field = Field()
-            self.__reset_available_dots_for_ships()
-            try:
-                for ship_size in self.__ship_sizes:
-                    variants = self.__dots_for_ship_size(ship_size)
-                    if not variants:
-                        raise SeaBattleException(f"Нет доступных вариантов размещения корабля размером {ship_size}")
-                    else:
-                        var = variants[random.randint(0, len(variants) - 1)]
-                        s = Ship(*[ShipPart(dot.x, dot.y) for dot in var])
-                        field.add_ship(s)
-                        s.remove_near_dots(self.__available_dots_for_ships)
-                return field
-            except SeaBattleException:
-                try_cnt += 1
-                if try_cnt == self.__max_tries:
-                    raise SeaBattleException("Не удаось сгенерировать поле.")
+        """Генерируем поле последовательно: корабль за кораблем.
+        Для каждого размера корабля заранее посчитаны маски всех вариантов размещения.
+        Вариант выбирается равновероятно среди тех, что не задевают уже размещенные корабли и их окрестность.
+        Если для очередного корабля вариантов не осталось, то отбрасываем уже выбранные маски и выбираем заново.
+        Поле при этом не пересоздается: объекты кораблей строятся один раз, когда все маски выбраны.
 
-    def __dots_for_ship_size(self, ship_size):
+        Откат только к предыдущему кораблю здесь не годится: он чаще оставляет варианты, из которых легко
+        попасть в тупик, и заметно меняет распределение кораблей по клеткам."""
+        field = Field(size=self.field_size, fleet=self.__ship_sizes, rng=self.__rng)
+        for cells in self.generate_layout():
+            field.add_ship(Ship(*[ShipPart(x, y) for x, y in cells]))
+        return field
+
+    def generate_layout(self):
+        """Расстановка, как у generate_rnd_field, но без объектов поля и кораблей.
+        :return: координаты палуб каждого корабля
         """
-        :param ship_size: Размер корабля
-        :return: Все возможные варианты размещения - список из список точек (палуб)
+        if self.layouts is not None:
+            return self.layouts.ships(self.layouts.sample(self.rng))
+        return self.__place_ships()
+
+    def sample_layout(self, wounded=0, empty=0):
+        """Случайная расстановка кораблей, согласованная с выстрелами по полю.
+        Сначала корабли накрывают подбитые палубы: для первой ненакрытой палубы вариант выбирается равновероятно
+        среди всех вариантов всех оставшихся кораблей через нее. Остальные корабли ставятся,
+        как в generate_rnd_field, только без повторных попыток.
+        :param wounded: маска подбитых палуб неубитых кораблей
+        :param empty: маска клеток, где кораблей нет: промахи, убитые корабли и их окрестность
+        :return: маска клеток кораблей или None, если зашли в тупик
         """
+        size = self.field_size
+        left = list(self.__ship_sizes)
+        blocked = empty
+        occupied = 0
+        uncovered = wounded
+        while uncovered:
+            cell = (uncovered & -uncovered).bit_length() - 1
+            variants = []
+            for ship_size in set(left):
+                placements = ship_placements(size, ship_size)
+                for i in ship_placement_cells(size, ship_size)[1][cell]:
+                    mask = placements.mask(i)
+                    # Корабль, у которого подбиты все палубы, был бы уже убит
+                    if not mask & blocked and mask & ~wounded:
+                        variants.append((placements, i, mask))
+            if not variants:
+                return None
+            placements, i, mask = variants[self.rng.randrange(len(variants))]
+            left.remove(placements.ship_size)
+            blocked |= placements.halo(i)
+            occupied |= mask
+            uncovered &= ~mask
+        for ship_size in sorted(left, reverse=True):
+            placements = ship_placements(size, ship_size)
+            i = self.__choose_placement(placements, blocked)
+            if i is None:
+                return None
+            blocked |= placements.halo(i)
+            occupied |= placements.mask(i)
+        return occupied
 
-        variants = []
-        for d in self.__available_dots_for_ships:
-            # Пробуем двигаться от точки по всем 4 направлениям
-            for direction in [ShipDirection.vertical, ShipDirection.gorisontal]:
-                for adder in [1, -1]:
-                    variant = [d]
-                    for c in range(1, ship_size):  # 1 палуба уже есть - это точка dot
-                        try:
-                            if direction == ShipDirection.vertical:
-                                check_dot = Dot(d.x + c * adder, d.y)
-                            else:
-                                check_dot = Dot(d.x, d.y + c * adder)
-                            if check_dot not in self.__available_dots_for_ships:
-                                break
-                        except SeaBattleException:
-                            break
-                        if self.__field.out(check_dot):
-                            break
-                        else:
-                            variant.append(check_dot)
-                    if len(variant) == ship_size:
-                        # Варианты будут повторяться: [(1,1) (1,2)] и [(1,2) (1,1)], но на логику это никак не повлияет.
-                        # Сортировать точки в списке и затем проверять входжение будет дольше.
-                        variants.append(variant)
-        return variants
+    def __place_ships(self):
+        """
+        :return: координаты палуб каждого корабля в порядке self.__ship_sizes
+        """
+        placements = [ship_placements(self.field_size, s) for s in self.__ship_sizes]
+        self.rejected_placements = 0
+        self.dead_ends = 0
+        try:
+            while True:
+                blocked = 0  # Занятые клетки вместе с окрестностью
+                chosen = []
+                for variants in placements:
+                    i = self.__choose_placement(variants, blocked)
+                    if i is None:
+                        break
+                    chosen.append(variants.cells(i))
+                    blocked |= variants.halo(i)
+                else:
+                    return chosen
+                self.dead_ends += 1
+                self.rejected_placements += len(chosen)
+                if self.dead_ends == self.__max_tries:
+                    raise SeaBattleException("Не удаось сгенерировать поле.")
+        finally:
+            self.total_rejected_placements += self.rejected_placements
+            if metrics.ENABLED:
+                GENERATOR_FIELDS.inc()
+                GENERATOR_REJECTED_PLACEMENTS.inc(self.rejected_placements)
+                GENERATOR_DEAD_ENDS.inc(self.dead_ends)
+
+    def __choose_placement(self, variants, blocked):
+        """Равновероятный выбор варианта, не пересекающегося с blocked.
+        Сначала пробуем случайные варианты из всех, и только если не повезло, отбираем подходящие полным перебором.
+        :param variants: ShipPlacements
+        :return: номер варианта или None, если подходящих нет
+        """
+        n = len(variants)
+        for _ in range(FieldGenerator.SAMPLE_TRIES):
+            i = self.rng.randrange(n)
+            if not variants.mask(i) & blocked:
+                return i
+            self.rejected_placements += 1
+        free = [i for i in range(n) if not variants.mask(i) & blocked]
+        if not free:
+            return None
+        return free[self.rng.randrange(len(free))]
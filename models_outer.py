@@ -1,15 +1,42 @@
+import collections
+import concurrent.futures
+import functools
+import heapq
+import os
 import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
 
+import metrics
+from gamelog import GameLogWriter
 from models_inner import(
+    Cell,
+    CellPool,
     Dot,
-    ShipPart,
-    Ship,
     Field,
     SeaBattleException,
     ShootResult,
-    ShipDirection,
     FieldGenerator,
+    SIZE,
+    canonical_masks,
+    cell_bit,
+    default_fleet,
+    describe_fleet,
+    game_seed,
+    neighbourhood_mask,
+    new_seed,
+    ship_placements,
+    ship_placement_cells,
 )
+from renderer import BoardRenderer
+
+
+AI_MOVE_SECONDS = metrics.REGISTRY.histogram("ai.move.seconds")  # Выбор хода компьютером, без ввода-вывода
+GAME_SHOTS = metrics.REGISTRY.histogram("game.shots", metrics.COUNT_BUCKETS)  # Выстрелов обоих игроков за партию
+GAME_LOOP_STEP_SECONDS = metrics.REGISTRY.histogram("game.loop_step.seconds")
+GAME_USER_FIELD_SECONDS = metrics.REGISTRY.histogram("game.init.user_field.seconds")
+GAME_AI_FIELD_SECONDS = metrics.REGISTRY.histogram("game.init.ai_field.seconds")
 
 
 class Player:
@@ -56,78 +83,978 @@ class User(Player):
                 return shot_dot
 
 
-class AI(Player):
-    def __init__(self, field):
-        super(AI, self).__init__(field)
-        self.__available_dots_for_shot = []  # Список доступных для выстрела точек
-        for i in range(1, self.field.size + 1):
-            for j in range(1, self.field.size + 1):
-                self.__available_dots_for_shot.append(Dot(i, j))
-        self.__hunting_ship = Ship()  # Раненый корабль за которым охотимся
+class Strategy(Player):
+    """Компьютерный игрок. Стратегия выбирает выстрел в next_shot и узнает его результат в add_ai_shot,
+    а ask добавляет к выбору только замер времени и вывод для игры с пользователем.
+    Стратегии регистрируются по имени (register_strategy), чтобы их можно было выбирать в Game и турнирах."""
+
+    def __init__(self, field, rng=None):
+        """
+        :param rng: random.Random для всех случайных выборов стратегии; по умолчанию общий генератор модуля random
+        """
+        super(Strategy, self).__init__(field)
+        self.__rng = rng  # Как в Field: модуль random не храним, чтобы стратегию можно было сериализовать
+
+    @property
+    def rng(self):
+        return self.__rng or random
 
     def ask(self):
-        dot = self.__gen_next_shot()
+        if metrics.ENABLED:
+            started = time.perf_counter()
+            dot = self.next_shot()
+            AI_MOVE_SECONDS.observe(time.perf_counter() - started)
+        else:
+            dot = self.next_shot()
         print(f"\nКомпьютер стреляет по координатам {dot.x, dot.y}")
         input("Нажмите Enter чтобы продолжить.")
         return dot
 
+    def next_shot(self):
+        """Следующий выстрел без ввода-вывода."""
+        raise NotImplementedError
+
+    def add_ai_shot(self, dot, res):
+        """Результат выстрела dot, выбранного next_shot."""
+        pass
+
+
+STRATEGIES = {}  # Имя стратегии -> фабрика компьютерного игрока: factory(доска, rng=None)
+
+
+def register_strategy(name, factory=None):
+    """Зарегистрировать фабрику компьютерного игрока под именем name.
+    Без factory возвращает декоратор класса: @register_strategy("my")."""
+    if factory is None:
+        return functools.partial(register_strategy, name)
+    if name in STRATEGIES:
+        raise SeaBattleException(f"Стратегия {name} уже зарегистрирована.")
+    STRATEGIES[name] = factory
+    return factory
+
+
+def get_strategy(strategy):
+    """Фабрика компьютерного игрока по имени стратегии; не строку возвращает как есть."""
+    if not isinstance(strategy, str):
+        return strategy
+    try:
+        return STRATEGIES[strategy]
+    except KeyError:
+        raise SeaBattleException(
+            f"Неизвестная стратегия {strategy}. Доступны: {', '.join(sorted(STRATEGIES))}."
+        ) from None
+
+
+def wounded_ship(cell, wounded, size):
+    """Подбитые палубы одного корабля: клетки wounded, связные с cell по вертикали и горизонтали.
+    Корабли не соприкасаются даже углами, поэтому палубы разных кораблей в один кусок не сливаются.
+    :param cell: номер клетки подбитой палубы
+    :param wounded: номера клеток подбитых палуб неубитых кораблей
+    :return: номера клеток в порядке обхода от cell: каждая следующая - рядом с одной из предыдущих
+    """
+    rest = set(wounded)
+    rest.discard(cell)
+    ship = [cell]
+    for c in ship:
+        y = c % size
+        for n in (c - size, c + size, c - 1 if y > 0 else -1, c + 1 if y < size - 1 else -1):
+            if n in rest:
+                rest.remove(n)
+                ship.append(n)
+    return ship
+
+
+class AI(Strategy):
+    """Компьютер, стреляющий в случайную клетку, а после попадания добивающий раненый корабль.
+
+    Еще не обстрелянные клетки лежат в CellPool, поэтому выбор случайной клетки, ее удаление и поиск клеток
+    рядом с подбитой палубой не зависят от размера поля. В режиме parity случайные выстрелы делаются только
+    по клеткам "шахматной" раскраски с шагом в длину самого короткого неубитого корабля: любой такой корабль
+    накрывает ровно одну клетку каждого цвета."""
+
+    def __init__(self, field, ship_sizes=None, parity=False, rng=None):
+        """
+        :param ship_sizes: размеры кораблей противника; по умолчанию такие же, как на своем поле
+        :param parity: стрелять вслепую только по клеткам, через которые может пройти самый короткий корабль
+        """
+        super(AI, self).__init__(field, rng)
+        self.__available_dots_for_shot = CellPool(self.field.size)  # Доступные для выстрела клетки
+        # Подбитые палубы неубитых кораблей (Cell). Сам AI ранит следующий корабль, только добив предыдущий,
+        # но наследники выбирают выстрелы сами и могут ранить несколько кораблей сразу
+        self.__wounded = []
+        self.parity = parity
+        self.__ships_left = collections.Counter(ship_sizes or self.field.fleet)  # Размер корабля -> сколько не убито
+        self.__step = 1  # Шаг раскраски
+        self.__colour = 0  # Какой цвет раскраски обстреливаем
+        self.__parity_dots = None  # Доступные клетки этого цвета, если шаг больше 1
+        self.__update_parity()
+
+    def next_shot(self):
+        return self.__gen_next_shot()
+
     def __gen_next_shot(self):
-        if self.__hunting_ship.size == 0:
-            return self.__available_dots_for_shot.pop(random.randint(0, len(self.__available_dots_for_shot) - 1))
+        if not self.__wounded:
+            if self.__parity_dots:
+                dot = self.__parity_dots.pop_random(self.rng)
+                self.__available_dots_for_shot.discard(dot)
+                return dot
+            dot = self.__available_dots_for_shot.pop_random(self.rng)
+            if self.__parity_dots is not None:
+                self.__parity_dots.discard(dot)
+            return dot
+        # Если есть раненый корабль, то добиваем его.
+        size = self.field.size
+        grid = Cell.grid(size)
+        parts = [grid[c] for c in self.__wounded_ship(self.__wounded[0])]
+        if len(parts) == 1:
+            # Пока подбита только 1 палуба, направления корабля не знаем.
+            candidates = self.__available_dots_for_shot.neighbours(parts[0])
         else:
-            # Если есть раненый корабль, то добиваем его.
-            if self.__hunting_ship.direction == ShipDirection.empty:
-                # Пока подбита только 1 палуба, направления корабля не знаем.
-                p = self.__hunting_ship.ship_parts[0]
-                for d in self.__available_dots_for_shot:
-                    if (d.x == p.x and abs(d.y - p.y) == 1) or (d.y == p.y and abs(d.x - p.x) == 1):
-                        self.__available_dots_for_shot.remove(d)
-                        return d
+            # Знаем направление корабля, т.е. есть хотя бы 2 палубы. Продолжаем линию с любого конца.
+            if parts[0].x == parts[1].x:
+                x = parts[0].x
+                ends = [(x, min(p.y for p in parts) - 1), (x, max(p.y for p in parts) + 1)]
             else:
-                # Знаем направление корабля, т.е. есть 2 палубы
-                direction = self.__hunting_ship.direction
-                p1 = self.__hunting_ship.ship_parts[0]
-                p2 = self.__hunting_ship.ship_parts[1]
-                for d in self.__available_dots_for_shot:
-                    if (
-                            direction == ShipDirection.gorisontal and d.x == p1.x and (
-                            abs(d.y - p1.y) == 1 or abs(d.y - p2.y) == 1)
-                    ) or (
-                            direction == ShipDirection.vertical and d.y == p1.y and (
-                            abs(d.x - p1.x) == 1 or abs(d.x - p2.x) == 1)
-                    ):
-                        self.__available_dots_for_shot.remove(d)
-                        return d
+                y = parts[0].y
+                ends = [(min(p.x for p in parts) - 1, y), (max(p.x for p in parts) + 1, y)]
+            candidates = [
+                grid[(x - 1) * size + y - 1] for x, y in ends
+                if 0 < x <= size and 0 < y <= size and self.__available_dots_for_shot.has_index((x - 1) * size + y - 1)
+            ]
+        if candidates:
+            dot = candidates[0]
+            self.__take(dot)
+            return dot
         raise SeaBattleException("Не смогли сгенерировать ход")
 
+    def __take(self, dot):
+        self.__available_dots_for_shot.discard(dot)
+        if self.__parity_dots is not None:
+            self.__parity_dots.discard(dot)
+
+    @staticmethod
+    def __remove_near(parts, pool):
+        """Убрать из pool (CellPool) клетки parts и вокруг них, как Ship.remove_near_dots."""
+        size = pool.size
+        grid = Cell.grid(size)
+        for p in parts:
+            for x in range(max(p.x - 1, 1), min(p.x + 1, size) + 1):
+                for y in range(max(p.y - 1, 1), min(p.y + 1, size) + 1):
+                    pool.discard(grid[(x - 1) * size + y - 1])
+
+    def __wounded_ship(self, cell):
+        """Номера клеток подбитых палуб корабля, которому принадлежит подбитая клетка cell (Cell)."""
+        return wounded_ship(cell.index, [c.index for c in self.__wounded], self.field.size)
+
+    def __update_parity(self):
+        """Пересобрать клетки раскраски, если изменилась длина самого короткого неубитого корабля."""
+        step = min((s for s, cnt in self.__ships_left.items() if cnt > 0), default=1) if self.parity else 1
+        if step == self.__step and (step == 1 or self.__parity_dots is not None):
+            return
+        self.__step = step
+        if step == 1:
+            self.__parity_dots = None
+            return
+        self.__colour = self.rng.randrange(step)
+        self.__parity_dots = CellPool(
+            self.field.size, [d for d in self.__available_dots_for_shot if (d.x + d.y) % step == self.__colour]
+        )
+
     def add_ai_shot(self, dot, res):
-        if res != ShootResult.missed:
-            self.__hunting_ship.add_part(ShipPart(dot.x, dot.y))
-        if self.__hunting_ship.size > 0 and res == ShootResult.killed:
+        cell = Cell.at(dot.x, dot.y, self.field.size)
+        # Клетку мог выбрать не next_shot этого класса, а наследник
+        self.__take(cell)
+        if res == ShootResult.missed:
+            return
+        self.__wounded.append(cell)
+        if res == ShootResult.killed:
+            killed = set(self.__wounded_ship(cell))
+            # Палубы - в порядке попаданий, как их добавлял бы Ship: от порядка удалений зависит порядок
+            # клеток в CellPool, а значит, и случайные выстрелы с тем же генератором
+            parts = [c for c in self.__wounded if c.index in killed]
             # Все точки вокруг убитого корабля надо убрать из доступных ходов
-            self.__hunting_ship.remove_near_dots(self.__available_dots_for_shot)
-            self.__hunting_ship = Ship()
+            self.__remove_near(parts, self.__available_dots_for_shot)
+            if self.__parity_dots is not None:
+                self.__remove_near(parts, self.__parity_dots)
+            self.__ships_left[len(parts)] -= 1
+            self.__wounded = [c for c in self.__wounded if c.index not in killed]
+            self.__update_parity()
+
+    def snapshot(self):
+        """Метка состояния выбора ходов для restore: для перебора вариантов без deepcopy.
+        Клетки в CellPool не копируются: снимок - глубина их журналов удалений, поэтому он стоит O(1)."""
+        parity_dots = self.__parity_dots
+        return (
+            self.__available_dots_for_shot.snapshot(),
+            parity_dots,
+            None if parity_dots is None else parity_dots.snapshot(),
+            tuple((c.x, c.y) for c in self.__wounded),
+            tuple(self.__ships_left.items()),
+            self.__step,
+            self.__colour,
+        )
+
+    def restore(self, snapshot):
+        """Вернуться к snapshot, отменив удаления клеток, сделанные после него.
+        Снимки, снятые позже snapshot, после этого недействительны."""
+        available, self.__parity_dots, parity_depth, hunting, ships_left, self.__step, self.__colour = snapshot
+        self.__available_dots_for_shot.restore(available)
+        if self.__parity_dots is not None:
+            # Раскраску могли пересобрать после снимка; тогда возвращается прежний набор, который с тех пор не менялся
+            self.__parity_dots.restore(parity_depth)
+        self.__wounded = [Cell.at(x, y, self.field.size) for x, y in hunting]
+        self.__ships_left = collections.Counter(dict(ships_left))
+
+    def dump_state(self):
+        """Полная копия состояния выбора ходов для load_state, например для упаковки партии в compact."""
+        return (
+            tuple(self.__available_dots_for_shot),
+            tuple((c.x, c.y) for c in self.__wounded),
+            tuple(self.__ships_left.items()),
+            self.__colour,
+            None if self.__parity_dots is None else tuple(self.__parity_dots),
+        )
+
+    def load_state(self, state):
+        """Заменить состояние выбора ходов копией из dump_state; снимки snapshot после этого недействительны."""
+        available, hunting, ships_left, self.__colour, parity_dots = state
+        size = self.field.size
+        self.__available_dots_for_shot = CellPool(size, available)
+        self.__wounded = [Cell.at(x, y, size) for x, y in hunting]
+        self.__ships_left = collections.Counter(dict(ships_left))
+        self.__parity_dots = None if parity_dots is None else CellPool(size, parity_dots)
+        self.__step = min((s for s, cnt in self.__ships_left.items() if cnt > 0), default=1) if self.parity else 1
+
+
+class DensityAI(Strategy):
+    """Компьютер, стреляющий в клетку, которую накрывает больше всего возможных размещений оставшихся кораблей.
+
+    Для каждого размера корабля хранится, какие варианты размещения еще возможны, и сколько таких вариантов
+    накрывает каждую клетку. После выстрела пересчитываются только варианты, накрывающие клетки,
+    про которые стало известно, что там нет корабля. Плотности только убывают, поэтому клетку с максимальной
+    плотностью можно искать в куче с ленивым обновлением: устаревшая запись пересчитывается, когда оказывается
+    на вершине кучи."""
+
+    def __init__(self, field, ship_sizes=None, rng=None):
+        """
+        :param ship_sizes: размеры кораблей противника; по умолчанию такие же, как на своем поле
+        """
+        super(DensityAI, self).__init__(field, rng)
+        self.__size = self.field.size
+        self.__ships_left = collections.Counter(ship_sizes or self.field.fleet)  # Размер корабля -> сколько таких еще не убито
+        self.__placements = {}  # Размер корабля -> (клетки вариантов, варианты по клеткам)
+        self.__valid = {}  # Размер корабля -> признак возможности каждого варианта
+        self.__cover = {}  # Размер корабля -> сколько возможных вариантов накрывает каждую клетку
+        for ship_size in self.__ships_left:
+            cells, covering = ship_placement_cells(self.__size, ship_size)
+            self.__placements[ship_size] = (cells, covering)
+            self.__valid[ship_size] = bytearray(b"\x01") * len(cells)
+            self.__cover[ship_size] = [len(c) for c in covering]
+        self.__known = bytearray(self.__size * self.__size)  # Стреляли, либо корабля там точно нет
+        self.__wounded = []  # Клетки подбитых палуб неубитых кораблей; раненых кораблей может быть несколько
+        # После первого snapshot - записи для отмены: (размер корабля, вариант) снятого варианта
+        # либо (None, клетка) - клетка стала известной или выбрана для выстрела
+        self.__journal = None
+        self.__heap = [(-self.__density(c), self.rng.random(), c) for c in range(self.__size * self.__size)]
+        heapq.heapify(self.__heap)
+
+    def __density(self, cell):
+        return sum(cnt * self.__cover[ship_size][cell] for ship_size, cnt in self.__ships_left.items() if cnt)
+
+    def next_shot(self):
+        cell = self.__target_cell() if self.__wounded else None
+        if cell is None:
+            cell = self.__hunt_cell()
+        return Cell.grid(self.__size)[cell]
+
+    def __hunt_cell(self):
+        heap = self.__heap
+        while heap:
+            neg_density, _, cell = heap[0]
+            if self.__known[cell]:
+                heapq.heappop(heap)
+                continue
+            density = self.__density(cell)
+            if density == -neg_density:
+                heapq.heappop(heap)
+                if self.__journal is not None:
+                    # Без выстрела клетку надо вернуть в кучу при откате
+                    self.__journal.append((None, cell))
+                return cell
+            heapq.heapreplace(heap, (-density, self.rng.random(), cell))
+        raise SeaBattleException("Не смогли сгенерировать ход")
+
+    def __target_cell(self):
+        """Клетка, которую накрывает больше всего возможных вариантов размещения раненого корабля.
+        Стреляем только рядом с подбитыми палубами, чтобы не ранить другой корабль, пока не добили этот.
+        Если раненых кораблей несколько (выстрелы выбирал точный перебор SolverAI), добиваем тот, что ранен первым."""
+        size = self.__size
+        wounded = wounded_ship(self.__wounded[0], self.__wounded, size)
+        ends = set()
+        for cell in wounded:
+            x, y = divmod(cell, size)
+            for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                if 0 <= nx < size and 0 <= ny < size:
+                    ends.add(nx * size + ny)
+        scores = {}
+        for ship_size, cnt in self.__ships_left.items():
+            if not cnt or ship_size <= len(wounded):
+                continue
+            cells, covering = self.__placements[ship_size]
+            valid = self.__valid[ship_size]
+            for i in covering[wounded[0]]:
+                if valid[i] and all(c in cells[i] for c in wounded):
+                    for c in cells[i]:
+                        if c in ends and not self.__known[c]:
+                            scores[c] = scores.get(c, 0) + cnt
+        if not scores:
+            return None
+        best = max(scores.values())
+        return self.rng.choice([c for c, score in scores.items() if score == best])
+
+    def __exclude(self, cell):
+        """В клетке точно нет корабля (либо там убитый корабль): все варианты через нее невозможны."""
+        self.__mark_known(cell)
+        for ship_size, (cells, covering) in self.__placements.items():
+            if not self.__ships_left[ship_size]:
+                continue
+            valid = self.__valid[ship_size]
+            cover = self.__cover[ship_size]
+            for i in covering[cell]:
+                if valid[i]:
+                    valid[i] = 0
+                    for c in cells[i]:
+                        cover[c] -= 1
+                    if self.__journal is not None:
+                        self.__journal.append((ship_size, i))
+
+    def __mark_known(self, cell):
+        if not self.__known[cell]:
+            self.__known[cell] = 1
+            if self.__journal is not None:
+                self.__journal.append((None, cell))
+
+    def __near_cells(self, cell, diagonal_only=False):
+        x, y = divmod(cell, self.__size)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if diagonal_only and (dx == 0 or dy == 0):
+                    continue
+                if 0 <= x + dx < self.__size and 0 <= y + dy < self.__size:
+                    yield (x + dx) * self.__size + y + dy
+
+    def add_ai_shot(self, dot, res):
+        cell = (dot.x - 1) * self.__size + dot.y - 1
+        self.__mark_known(cell)
+        if res == ShootResult.missed:
+            self.__exclude(cell)
+            return
+        self.__wounded.append(cell)
+        if res == ShootResult.injure:
+            # Корабли не соприкасаются даже углами, поэтому по диагоналям от палубы пусто
+            for c in self.__near_cells(cell, diagonal_only=True):
+                self.__exclude(c)
+        elif res == ShootResult.killed:
+            # Убитый корабль - подбитые палубы, связные с этой клеткой; другие раненые корабли остаются
+            killed = wounded_ship(cell, self.__wounded, self.__size)
+            self.__ships_left[len(killed)] -= 1
+            for c in {n for part in killed for n in self.__near_cells(part)}:
+                self.__exclude(c)
+            killed = set(killed)
+            self.__wounded = [c for c in self.__wounded if c not in killed]
+
+    def snapshot(self):
+        """Метка состояния для restore: глубина журнала отмены и мелкие поля, без копий массивов вариантов."""
+        if self.__journal is None:
+            self.__journal = []
+        return (
+            len(self.__journal),
+            tuple(self.__ships_left.items()),
+            tuple(self.__wounded),
+        )
+
+    def restore(self, snapshot):
+        """Откатить журнал до snapshot: вернуть варианты и покрытия клеток, известные клетки.
+        Снимки, снятые позже snapshot, после этого недействительны."""
+        depth, ships_left, wounded = snapshot
+        journal = self.__journal
+        if journal is None or depth > len(journal):
+            raise SeaBattleException("Снимок снят не с этого состояния.")
+        affected = set()  # Клетки, плотность которых могла вырасти
+        while len(journal) > depth:
+            ship_size, i = journal.pop()
+            if ship_size is None:
+                self.__known[i] = 0
+                affected.add(i)
+                continue
+            self.__valid[ship_size][i] = 1
+            cover = self.__cover[ship_size]
+            for c in self.__placements[ship_size][0][i]:
+                cover[c] += 1
+                affected.add(c)
+        ships_left = collections.Counter(dict(ships_left))
+        revived = any(cnt > self.__ships_left[ship_size] for ship_size, cnt in ships_left.items())
+        self.__ships_left = ships_left
+        self.__wounded = list(wounded)
+        # Куча рассчитана на то, что плотности только убывают: для выросших плотностей кладем свежие записи
+        cells = self.__size * self.__size
+        if revived or len(self.__heap) + len(affected) > 2 * cells:
+            # Вернулся убитый корабль - выросли плотности почти всех клеток; либо куча разрослась от повторов
+            self.__heap = [(-self.__density(c), self.rng.random(), c) for c in range(cells) if not self.__known[c]]
+            heapq.heapify(self.__heap)
+        else:
+            for c in affected:
+                if not self.__known[c]:
+                    heapq.heappush(self.__heap, (-self.__density(c), self.rng.random(), c))
+
+
+class Observations:
+    """Что компьютер знает о поле противника по своим выстрелам, в виде масок клеток."""
+
+    def __init__(self, size, fleet):
+        self.size = size
+        self.fleet = sorted(fleet, reverse=True)  # Размеры неубитых кораблей
+        self.wounded = 0  # Подбитые палубы неубитых кораблей
+        self.empty = 0  # Промахи, убитые корабли и их окрестность
+
+    def add(self, dot, res):
+        """:return: маска убитого этим выстрелом корабля или 0"""
+        bit = cell_bit(dot.x, dot.y, self.size)
+        if res == ShootResult.missed:
+            self.empty |= bit
+            return 0
+        self.wounded |= bit
+        if res != ShootResult.killed:
+            return 0
+        # Убитый корабль - связный кусок подбитых палуб, в котором эта клетка
+        ship = bit
+        while True:
+            grown = neighbourhood_mask(ship, self.size) & self.wounded
+            if grown == ship:
+                break
+            ship = grown
+        self.wounded &= ~ship
+        self.empty |= neighbourhood_mask(ship, self.size)
+        self.fleet.remove(bin(ship).count("1"))
+        return ship
+
+    def snapshot(self):
+        return tuple(self.fleet), self.wounded, self.empty
+
+    def restore(self, snapshot):
+        fleet, self.wounded, self.empty = snapshot
+        self.fleet = list(fleet)
+
+
+def consistent_layouts(size, fleet, wounded, empty, limit, budget=None):
+    """Расстановки кораблей fleet, согласованные с тем, что известно о поле противника.
+    Сначала ставим корабли, накрывающие подбитые палубы (для первой ненакрытой палубы перебираем все корабли
+    через нее), потом остальные корабли на свободное место: так тупиковые ветви отсекаются сразу.
+    :param fleet: размеры еще не убитых кораблей
+    :param wounded: маска подбитых палуб неубитых кораблей
+    :param empty: маска клеток, где кораблей точно нет, включая убитые корабли и их окрестность
+    :param limit: сколько расстановок искать
+    :param budget: сколько кораблей можно поставить за весь перебор; None - без ограничений
+    :return: список пар (маска кораблей, маски каждого корабля) или None, если расстановок больше limit
+             либо перебор не уложился в budget
+    """
+    placements = {s: ship_placements(size, s) for s in set(fleet)}
+    found = []
+    steps = [budget if budget is not None else -1]
+
+    def spend():
+        steps[0] -= 1
+        return steps[0] == 0
+
+    def place_free(sizes, k, blocked, occupied, first, ships):
+        if k == len(sizes):
+            found.append((occupied, tuple(ships)))
+            return len(found) > limit
+        if spend():
+            return True
+        variants = placements[sizes[k]]
+        same_next = k + 1 < len(sizes) and sizes[k + 1] == sizes[k]
+        for i in range(first, len(variants)):
+            mask = variants.mask(i)
+            if mask & blocked:
+                continue
+            ships.append(mask)
+            if place_free(sizes, k + 1, blocked | variants.halo(i), occupied | mask, i + 1 if same_next else 0, ships):
+                return True
+            ships.pop()
+        return False
+
+    def cover_wounded(left, blocked, occupied, ships):
+        uncovered = wounded & ~occupied
+        if spend():
+            return True
+        if not uncovered:
+            return place_free(sorted(left, reverse=True), 0, blocked, occupied, 0, ships)
+        cell = (uncovered & -uncovered).bit_length() - 1
+        for ship_size in sorted(set(left), reverse=True):
+            rest = list(left)
+            rest.remove(ship_size)
+            variants = placements[ship_size]
+            for i in ship_placement_cells(size, ship_size)[1][cell]:
+                mask = variants.mask(i)
+                # Корабль, у которого подбиты все палубы, был бы уже убит
+                if mask & blocked or not mask & ~wounded:
+                    continue
+                ships.append(mask)
+                if cover_wounded(rest, blocked | variants.halo(i), occupied | mask, ships):
+                    return True
+                ships.pop()
+        return False
+
+    return None if cover_wounded(list(fleet), empty, 0, []) else found
+
+
+def split_layouts(layouts, bit, wounded):
+    """Разбить расстановки по результату выстрела в клетку bit.
+    :return: (промах, ранил, убил, маска убитого корабля); у расстановок из "убил" убитый корабль уже убран
+    """
+    missed, injured, killed = [], [], []
+    killed_ship = 0
+    after = wounded | bit
+    for layout in layouts:
+        if not layout[0] & bit:
+            missed.append(layout)
+            continue
+        ship = next(s for s in layout[1] if s & bit)
+        if ship & ~after:
+            injured.append(layout)
+        else:
+            killed_ship = ship
+            killed.append((layout[0] & ~ship, tuple(s for s in layout[1] if s != ship)))
+    return missed, injured, killed, killed_ship
+
+
+class EndgameSolver:
+    """Точный выбор выстрела, минимизирующего ожидаемое кол-во выстрелов до конца партии,
+    для небольшого набора равновероятных расстановок.
+
+    Ожидание для позиции запоминается в ограниченном LRU-кэше. Ключ - подбитые палубы, пустые клетки
+    и оставшийся флот; позиции, переходящие друг в друга при поворотах и отражениях поля, имеют один ключ."""
+
+    def __init__(self, size, memo_size=200000):
+        self.size = size
+        self.memo_size = memo_size
+        self.__memo = collections.OrderedDict()
+        self.nodes = 0  # Сколько позиций было просчитано
+
+    def best_shot(self, layouts, wounded, empty, fleet):
+        """:return: (ожидаемое кол-во выстрелов до конца, бит клетки для выстрела)"""
+        self.nodes += 1
+        n = len(layouts)
+        left = sum(fleet) - bin(wounded).count("1")  # Столько выстрелов придется сделать как минимум
+        if n == 1:
+            cells = layouts[0][0] & ~wounded
+            return float(left), cells & -cells
+        union = 0
+        for occupied, _ in layouts:
+            union |= occupied
+        hits = {}  # Бит клетки -> в скольких расстановках там корабль
+        cells = union & ~wounded
+        while cells:
+            bit = cells & -cells
+            cells ^= bit
+            hits[bit] = sum(1 for occupied, _ in layouts if occupied & bit)
+        best, best_bit = float("inf"), None
+        for bit in sorted(hits, key=hits.get, reverse=True):
+            miss_share = (n - hits[bit]) / n
+            if 1 + left - (1 - miss_share) >= best:
+                continue
+            missed, injured, killed, ship = split_layouts(layouts, bit, wounded)
+            expected = 1.0
+            if missed:
+                expected += miss_share * self.expected(missed, wounded, empty | bit, fleet)
+            if expected + (1 - miss_share) * (left - 1) >= best:
+                continue
+            if injured:
+                expected += len(injured) / n * self.expected(injured, wounded | bit, empty, fleet)
+            if killed:
+                rest = list(fleet)
+                rest.remove(bin(ship).count("1"))
+                expected += len(killed) / n * self.expected(
+                    killed, (wounded | bit) & ~ship, empty | neighbourhood_mask(ship, self.size), tuple(rest),
+                )
+            if expected < best:
+                best, best_bit = expected, bit
+                if best <= left:
+                    break  # Лучше не бывает: ни одного промаха
+        return best, best_bit
+
+    def expected(self, layouts, wounded, empty, fleet):
+        if not fleet:
+            return 0.0
+        # Та же позиция чаще всего встречается в том же виде, поэтому сначала ищем без приведения
+        raw_key = (wounded, empty, fleet)
+        value = self.__memo.get(raw_key)
+        if value is None:
+            key = (*canonical_masks((wounded, empty), self.size), fleet)
+            value = self.__memo.get(key)
+            if value is None:
+                value = self.best_shot(layouts, wounded, empty, fleet)[0]
+                self.__remember(key, value)
+            self.__remember(raw_key, value)
+        else:
+            self.__memo.move_to_end(raw_key)
+        return value
+
+    def __remember(self, key, value):
+        self.__memo[key] = value
+        self.__memo.move_to_end(key)
+        if len(self.__memo) > self.memo_size:
+            self.__memo.popitem(last=False)
+
+
+@functools.lru_cache(maxsize=None)
+def shared_endgame_solver(size):
+    """Один решатель на размер поля: кэш позиций переиспользуется всеми SolverAI."""
+    return EndgameSolver(size)
+
+
+class SolverAI(DensityAI):
+    """Компьютер, который ходит как DensityAI, пока согласованных с выстрелами расстановок много,
+    а когда их остается не больше threshold, выбирает выстрел точным перебором (EndgameSolver)."""
+
+    THRESHOLD = 20
+    ENUMERATION_BUDGET = 5000  # Сколько кораблей можно поставить, проверяя, мало ли расстановок
+
+    def __init__(self, field, ship_sizes=None, threshold=THRESHOLD, solver=None, rng=None):
+        """
+        :param threshold: при каком кол-ве согласованных расстановок включать точный перебор
+        :param solver: EndgameSolver; по умолчанию общий для всех SolverAI на этом размере поля
+        """
+        super(SolverAI, self).__init__(field, ship_sizes, rng)
+        self.__size = self.field.size
+        self.__seen = Observations(self.__size, ship_sizes or self.field.fleet)
+        self.__layouts = None  # Согласованные расстановки, когда их стало не больше threshold
+        self.threshold = threshold
+        self.solver = solver or shared_endgame_solver(self.__size)
+
+    def next_shot(self):
+        seen = self.__seen
+        if self.__layouts is None:
+            self.__layouts = consistent_layouts(
+                self.__size, seen.fleet, seen.wounded, seen.empty, self.threshold, self.ENUMERATION_BUDGET,
+            )
+        if not self.__layouts:
+            # Расстановок еще много, либо флот противника не такой, как мы думали
+            return super(SolverAI, self).next_shot()
+        _, bit = self.solver.best_shot(self.__layouts, seen.wounded, seen.empty, tuple(seen.fleet))
+        return Cell.grid(self.__size)[bit.bit_length() - 1]
+
+    def add_ai_shot(self, dot, res):
+        super(SolverAI, self).add_ai_shot(dot, res)
+        if self.__layouts is not None:
+            missed, injured, killed, _ = split_layouts(
+                self.__layouts, cell_bit(dot.x, dot.y, self.__size), self.__seen.wounded,
+            )
+            self.__layouts = {ShootResult.missed: missed, ShootResult.injure: injured, ShootResult.killed: killed}[res]
+        self.__seen.add(dot, res)
+
+    def snapshot(self):
+        # Список расстановок после выстрела заменяется новым, а не меняется, поэтому его можно не копировать
+        return super(SolverAI, self).snapshot(), self.__seen.snapshot(), self.__layouts
+
+    def restore(self, snapshot):
+        base, seen, self.__layouts = snapshot
+        super(SolverAI, self).restore(base)
+        self.__seen.restore(seen)
+
+
+def sample_hit_counts(size, fleet, wounded, empty, budget, seed=None):
+    """Сэмплировать расстановки, согласованные с выстрелами, пока не выйдет время budget (секунды).
+    Функция уровня модуля, чтобы ее можно было выполнить в другом процессе.
+    :param seed: seed генератора расстановок; None - общий генератор модуля random
+    :return: (сколько раз каждая еще не обстрелянная клетка оказалась занята кораблем, кол-во расстановок)
+    """
+    fgen = FieldGenerator(size, fleet, rng=None if seed is None else random.Random(seed))
+    counts = [0] * (size * size)
+    samples = 0
+    deadline = time.perf_counter() + budget
+    while True:
+        occupied = fgen.sample_layout(wounded, empty)
+        if occupied is not None:
+            samples += 1
+            occupied &= ~wounded
+            while occupied:
+                bit = occupied & -occupied
+                occupied ^= bit
+                counts[bit.bit_length() - 1] += 1
+        if time.perf_counter() >= deadline:
+            return counts, samples
+
+
+def warm_up():
+    """Пустая задача: заставляет пул процессов запустить процессы заранее."""
+
+
+@functools.lru_cache(maxsize=None)
+def sampling_pool(workers):
+    """Пул процессов для MonteCarloAI: один на кол-во процессов и живет до конца программы."""
+    pool = ProcessPoolExecutor(max_workers=workers)
+    for _ in range(workers):
+        pool.submit(warm_up)
+    return pool
+
+
+class MonteCarloAI(AI):
+    """Компьютер, стреляющий в клетку, которая чаще всего занята кораблем в случайных расстановках,
+    согласованных с его выстрелами (FieldGenerator.sample_layout).
+
+    Расстановки сэмплируются в пуле процессов, каждый процесс - не дольше budget секунд. Если за ход
+    не получено ни одной расстановки (процессы заняты или еще не запущены), ход выбирает AI: все выстрелы
+    учитываются и в нем, поэтому он знает обстрелянные клетки и раненые корабли."""
+
+    BUDGET = 0.005  # Секунд на сэмплирование за ход
+
+    def __init__(self, field, ship_sizes=None, budget=BUDGET, workers=None, rng=None):
+        """
+        :param ship_sizes: размеры кораблей противника; по умолчанию такие же, как на своем поле
+        :param budget: сколько секунд сэмплировать за ход
+        :param workers: кол-во процессов; None - по числу ядер, 0 - сэмплировать в текущем процессе
+        :param rng: random.Random; seed сэмплирования берутся из него, но кол-во расстановок за ход
+                    зависит от времени, поэтому ходы MonteCarloAI воспроизводятся только приблизительно
+        """
+        super(MonteCarloAI, self).__init__(field, ship_sizes, rng=rng)
+        self.__size = self.field.size
+        self.__seen = Observations(self.__size, ship_sizes or self.field.fleet)
+        self.budget = budget
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.pool = sampling_pool(self.workers) if self.workers else None
+        self.samples = 0  # Сколько расстановок получено на последнем ходе
+
+    def __hit_counts(self):
+        seen = self.__seen
+        args = (self.__size, seen.fleet, seen.wounded, seen.empty, self.budget)
+        if self.pool is None:
+            return sample_hit_counts(*args, self.rng.getrandbits(64))
+        futures = [self.pool.submit(sample_hit_counts, *args, self.rng.getrandbits(64)) for _ in range(self.workers)]
+        # Процессу нужно еще время на запуск задачи и передачу ответа
+        done, not_done = concurrent.futures.wait(futures, timeout=2 * self.budget)
+        for future in not_done:
+            future.cancel()
+        counts = [0] * (self.__size * self.__size)
+        samples = 0
+        for future in done:
+            part, part_samples = future.result()
+            counts = [a + b for a, b in zip(counts, part)]
+            samples += part_samples
+        return counts, samples
+
+    def next_shot(self):
+        counts, self.samples = self.__hit_counts()
+        known = self.__seen.wounded | self.__seen.empty
+        best = 0
+        cells = []
+        for i, count in enumerate(counts):
+            if count >= best and count and not known >> i & 1:
+                if count > best:
+                    best = count
+                    cells = []
+                cells.append(i)
+        if not cells:
+            return super(MonteCarloAI, self).next_shot()
+        return Cell.grid(self.__size)[self.rng.choice(cells)]
+
+    def add_ai_shot(self, dot, res):
+        super(MonteCarloAI, self).add_ai_shot(dot, res)
+        self.__seen.add(dot, res)
+
+    def snapshot(self):
+        return super(MonteCarloAI, self).snapshot(), self.__seen.snapshot()
+
+    def restore(self, snapshot):
+        base, seen = snapshot
+        super(MonteCarloAI, self).restore(base)
+        self.__seen.restore(seen)
+
+
+register_strategy("simple", AI)
+register_strategy("parity", functools.partial(AI, parity=True))
+register_strategy("density", DensityAI)
+register_strategy("solver", SolverAI)
+# В турнирах и пакетных прогонах параллельны сами партии, поэтому своего пула процессов у стратегии нет
+register_strategy("montecarlo", functools.partial(MonteCarloAI, workers=0))
+
+
+class GameEventKind(Enum):
+    shot = 0  # Выстрел игрока player по клетке dot с результатом result
+    win = 1  # Игрок player победил
+    turn = 2  # Ход переходит к игроку player
+
+
+GameEvent = collections.namedtuple("GameEvent", "kind player dot result")
+TURN_EVENTS = tuple(GameEvent(GameEventKind.turn, player, None, None) for player in (0, 1))
+WIN_EVENTS = tuple(GameEvent(GameEventKind.win, player, None, None) for player in (0, 1))
+
+
+class GameState:
+    """Правила партии двух игроков без ввода-вывода: чья очередь, результат выстрела, победа.
+    Игроки - 0 (ходит первым) и 1; выстрелы подаются в submit_shot, а он возвращает события, по которым
+    консоль, сервер или пакетная симуляция показывают или записывают ход."""
+
+    def __init__(self, first_field, second_field):
+        """
+        :param first_field: доска первого игрока; по ней стреляет второй игрок
+        :param second_field: доска второго игрока
+        """
+        self.fields = (first_field, second_field)
+        self.turn = 0  # Чей сейчас ход
+        self.winner = None
+        self.shots = [0, 0]  # Выстрелов каждого игрока
+
+    @property
+    def finished(self):
+        return self.winner is not None
+
+    def submit_shot(self, player, dot):
+        """Выстрел игрока player по доске противника.
+        :return: кортеж GameEvent: выстрел, затем победа либо, после промаха, переход хода
+        """
+        if self.winner is not None:
+            raise SeaBattleException("Партия окончена.")
+        if player != self.turn:
+            raise SeaBattleException("Сейчас ход другого игрока.")
+        field = self.fields[1 - player]
+        res = field.shoot(dot)  # За пределами доски - SeaBattleException
+        self.shots[player] += 1
+        shot = GameEvent(GameEventKind.shot, player, dot, res)
+        if res is ShootResult.missed:
+            self.turn = 1 - player
+            return shot, TURN_EVENTS[self.turn]
+        if res is ShootResult.killed and not field.has_alive_ships:
+            self.winner = player
+            return shot, WIN_EVENTS[player]
+        return shot,
 
 
 class Game:
-    def __init__(self, auto_field=True):
+    def __init__(
+            self, auto_field=True, size=SIZE, fleet=None, renderer=None, profile_path=None, log_path=None, ai=AI,
+            seed=None, pool=None, layouts=None,
+    ):
+        """
+        :param size: размер полей
+        :param fleet: размеры кораблей каждого игрока; по умолчанию default_fleet(size)
+        :param renderer: BoardRenderer для вывода досок
+        :param profile_path: выполнить start под cProfile и сохранить статистику в этот файл
+        :param log_path: дописывать каждую партию в этот архив (см. gamelog); пользователь - первый игрок
+        :param ai: стратегия компьютера: имя из STRATEGIES или фабрика, принимающая доску компьютера
+        :param seed: главный seed сессии; k-я партия играется с генератором random.Random(game_seed(seed, k)).
+                     По умолчанию - из энтропии ОС
+        :param pool: field_pool.FieldPool, из которого берутся готовые поля. Такие поля построены генераторами
+                     запаса, а не random.Random(game_seed(seed, k)), поэтому партии с запасом по seed не повторить
+        :param layouts: layout_table.LayoutTable для size и fleet: поля - случайные строки таблицы (выбор за O(1)),
+                        а не расстановки FieldGenerator. Запас полей с таблицей не нужен
+        """
         self.user = None
         self.ai = None
+        self.state = None  # GameState текущей партии; пользователь - игрок 0, компьютер - 1
+        self.ai_factory = get_strategy(ai)
+        self.renderer = renderer or BoardRenderer()
         self.__auto_field = True  # Признак автогенерации поля пользователя
-        random.seed()
+        self.size = size
+        self.fleet = tuple(fleet or default_fleet(size))
+        self.profile_path = profile_path
+        self.log_path = log_path
+        self.log = None  # GameLogWriter сессии; открывается с первой партией, закрывается в close
+        self.shots = 0  # Выстрелов обоих игроков в текущей партии
+        self.seed = new_seed() if seed is None else seed
+        self.games = 0  # Начатых партий; номер следующей партии для game_seed
+        self.game_seed = None  # Seed текущей партии
+        self.pool = pool
+        self.layouts = layouts
+        if layouts is not None and not layouts.matches(self.size, self.fleet):
+            raise SeaBattleException("Таблица расстановок не подходит для этого поля и флота.")
+        if pool is not None:
+            pool.prefetch(self.size, self.fleet)
 
-    @staticmethod
-    def greet():
+    def greet(self):
         print(
             "Игра \"морской бой\" c компьютером."
-            "\nИгровое поле представляет собой квадрат, размером 6*6 клеток."
-            "\nВ вашем распоряжении 1 корабль на 3 клетки, 2 корабля на 2 клетки и 4 корабля на одну клетку."
+            f"\nИгровое поле представляет собой квадрат, размером {self.size}*{self.size} клеток."
+            f"\nВ вашем распоряжении {describe_fleet(self.fleet)}."
             "\nКорабли должны распогалаться строго вертикально или горизонтально."
         )
 
     def start(self):
+        if self.profile_path:
+            metrics.profile(self.__play, self.profile_path)
+        else:
+            self.__play()
+
+    def close(self):
+        """Закрыть архив партий сессии."""
+        if self.log:
+            self.log.close()
+            self.log = None
+
+    def __play(self):
         self.init_players_fields()
-        self.loop()
+        if self.log_path:
+            if self.log is None:
+                self.log = GameLogWriter(self.log_path)
+            self.log.begin(self.user.field, self.ai.field, seed=self.game_seed, game=self.games - 1)
+        try:
+            self.loop()
+        finally:
+            if self.log:
+                # Прерванная партия тоже попадает в архив - с теми ходами, что успели сделать
+                self.log.end()
+                self.log.flush()
+
+    @staticmethod
+    def play_headless(
+            first_ai=AI, second_ai=AI, size=SIZE, fleet=None, log=None, fields=None, seed=None, game=0, layouts=None,
+    ):
+        """Партия компьютера против компьютера без ввода-вывода. Первым ходит первый игрок.
+        :param first_ai: стратегия игрока, который ходит первым: имя из STRATEGIES или фабрика
+        :param second_ai: стратегия второго игрока
+        :param size: размер полей
+        :param fleet: размеры кораблей; по умолчанию default_fleet(size)
+        :param log: дописать партию в этот архив: gamelog.GameLogWriter или GameLogBuffer
+        :param fields: готовые доски (первого игрока, второго игрока) вместо случайных
+        :param seed: seed партии: доски и ходы берутся из random.Random(seed), и с тем же seed партия повторяется
+                     в точности (кроме MonteCarloAI, который сэмплирует по времени); None - общий генератор random
+        :param game: номер партии для архива
+        :param layouts: layout_table.LayoutTable, из которой берутся случайные доски (см. FieldGenerator)
+        :return: (True если победил первый игрок, кол-во выстрелов победителя)
+        """
+        rng = None if seed is None else random.Random(seed)
+        if fields is None:
+            fgen = FieldGenerator(size, fleet or default_fleet(size), layouts=layouts, rng=rng)
+            fields = fgen.generate_rnd_field(), fgen.generate_rnd_field()
+        players = [get_strategy(first_ai)(fields[0], rng=rng), get_strategy(second_ai)(fields[1], rng=rng)]
+        if log is None:
+            return Game.__play_headless(players)
+        record = log.begin(players[0].field, players[1].field, seed=seed or 0, game=game)
+        try:
+            return Game.__play_headless(players, record)
+        finally:
+            log.end()
+
+    @staticmethod
+    def __play_headless(players, log=None):
+        state = GameState(players[0].field, players[1].field)
+        while state.winner is None:
+            turn = state.turn
+            mover = players[turn]
+            if metrics.ENABLED:
+                started = time.perf_counter()
+                dot = mover.next_shot()
+                AI_MOVE_SECONDS.observe(time.perf_counter() - started)
+            else:
+                dot = mover.next_shot()
+            res = state.submit_shot(turn, dot)[0].result
+            if log:
+                log.record(turn, dot, res)
+            mover.add_ai_shot(dot, res)
+        if metrics.ENABLED:
+            GAME_SHOTS.observe(sum(state.shots))
+        return state.winner == 0, state.shots[state.winner]
 
     @property
     def auto_field(self):
@@ -192,64 +1119,76 @@ class Game:
         #         ShipPart(6, 6),
         #     ),
         # )
-        fgen = FieldGenerator()
+        self.game_seed = game_seed(self.seed, self.games)
+        self.games += 1
+        rng = random.Random(self.game_seed)
+        if self.pool is not None and self.layouts is None:
+            generate = functools.partial(self.pool.take, self.size, self.fleet, rng)
+        else:
+            generate = FieldGenerator(self.size, self.fleet, layouts=self.layouts, rng=rng).generate_rnd_field
+        started = time.perf_counter()
         if self.auto_field:
-            self.user = User(fgen.generate_rnd_field())
+            self.user = User(generate())
         else:
-            self.user = User(Field.read_player_field())
-        self.ai = AI(fgen.generate_rnd_field())
+            # Сюда входит и время ввода поля пользователем
+            self.user = User(Field.read_player_field(self.size, self.fleet))
+        generated = time.perf_counter()
+        self.ai = self.ai_factory(generate(), rng=rng)
+        if metrics.ENABLED:
+            GAME_USER_FIELD_SECONDS.observe(generated - started)
+            GAME_AI_FIELD_SECONDS.observe(time.perf_counter() - generated)
+        self.state = GameState(self.user.field, self.ai.field)
+        self.shots = 0
 
     def loop(self):
         self.show_position()
-        ai_step = False
-        while True:
-            if self.loop_step(ai_step):
-                return  # Есть выигрыш, заканчиваем
-            else:
-                ai_step = not ai_step
+        while not self.loop_step(self.state.turn == 1):
+            pass
+        if metrics.ENABLED:
+            GAME_SHOTS.observe(self.shots)
 
     def loop_step(self, ai_step=False):
         """
-        Цикл выстрелов одного игрока до тех пор, пока не будет промаха или его победы
+        Цикл выстрелов одного игрока до тех пор, пока не будет промаха или его победы.
+        Правила - в GameState, здесь только ввод выстрелов и вывод их результатов.
         :param ai_step: True если ход комьютера
         :return: True если есть победитель, False если промазали
         """
+        started = time.perf_counter()
+        player = 1 if ai_step else 0
+        mover = self.ai if ai_step else self.user
         while True:
-            has_winner = False
-            if ai_step:
-                mover = self.ai
-                other_player = self.user
-            else:
-                mover = self.user
-                other_player = self.ai
-
             dot = mover.ask()
             try:
-                res = other_player.enemy_shoot(dot)
+                events = self.state.submit_shot(player, dot)
             except SeaBattleException as e:
                 print(e)
                 continue
+            res = events[0].result
+            self.shots += 1
+            if self.log:
+                self.log.record(player, dot, res)
             if mover == self.ai:
                 self.ai.add_ai_shot(dot, res)
-            if res == ShootResult.missed:
-                print("Промазал!")
+            kind = events[-1].kind
+            if kind == GameEventKind.turn:
+                message = "Промазал!"
+                break
+            elif kind == GameEventKind.win:
+                message = "Убил!\n" + ("Вы проиграли." if ai_step else "Вы выиграли!")
                 break
-            elif res == ShootResult.injure:
-                print("Ранил!")
-                self.show_position()
-            elif res == ShootResult.killed:
-                print("Убил!")
-                if not other_player.field.has_alive_ships:
-                    has_winner = True
-                    print("Вы проиграли." if ai_step else "Вы выиграли!")
-                    break
-                else:
-                    self.show_position()
-        self.show_position(enemy_hidden=not has_winner)
+            self.show_position(message="Ранил!" if res == ShootResult.injure else "Убил!")
+        has_winner = self.state.finished
+        self.show_position(enemy_hidden=not has_winner, message=message)
+        if metrics.ENABLED:
+            GAME_LOOP_STEP_SECONDS.observe(time.perf_counter() - started)
         return has_winner
 
-    def show_position(self, enemy_hidden=True):
-        print("Ваша доска:")
-        self.user.field.show_position()
-        print("Доска компьютера:")
-        self.ai.field.show_position(enemy_hidden)
+    def show_position(self, enemy_hidden=True, message=None):
+        """
+        :param message: сообщение о результате выстрела, выводится вместе с досками
+        """
+        self.renderer.render([
+            ("Ваша доска:", self.user.field, False),
+            ("Доска компьютера:", self.ai.field, enemy_hidden),
+        ], message)
@@ -0,0 +1,109 @@
+"""Вывод досок кадрами: кадр собирается целиком и выводится в поток одной записью."""
+import sys
+
+
+CSI = "\x1b["  # Начало управляющей последовательности ANSI
+
+
+class BoardRenderer:
+    """Отрисовка досок кадрами.
+
+    Строки досок кэшируются и перерисовываются, только если поле изменило их с прошлого кадра
+    (см. Field.row_revision). В режиме ansi первый кадр выводится с очисткой экрана, а дальше, пока набор
+    досок не меняется, выводятся только изменившиеся клетки с позиционированием курсора.
+    Текст, выведенный под досками между кадрами, при этом стирается."""
+
+    def __init__(self, stream=None, ansi=False):
+        """
+        :param stream: куда выводить; по умолчанию текущий sys.stdout
+        :param ansi: перерисовывать только изменившиеся клетки с помощью ANSI-последовательностей
+        """
+        self.stream = stream
+        self.ansi = ansi
+        # (id поля, hidden) -> (поле, ревизии строк, символы клеток строк, текст строк); только доски последнего кадра
+        self.__rows = {}
+        self.__layout = None  # Набор досок на экране в режиме ansi
+        self.__screen = None  # Символы клеток досок на экране в режиме ansi
+
+    def reset(self):
+        """Забыть кэш строк и содержимое экрана: следующий кадр будет выведен целиком."""
+        self.__rows = {}
+        self.__layout = None
+        self.__screen = None
+
+    @staticmethod
+    def label_width(field):
+        return len(str(field.size)) + 1
+
+    def __cached_rows(self, field, hidden):
+        """:return: (символы клеток строк, текст строк, номера строк, изменившихся с прошлого кадра)"""
+        key = (id(field), hidden)
+        cached = self.__rows.get(key)
+        if cached is None or cached[0] is not field:
+            width = self.label_width(field)
+            header = " ".ljust(width) + "".join(f"{str(i):2s}" for i in range(1, field.size + 1))
+            cached = (field, [-1] * (field.size + 1), [None] * (field.size + 1), [header] + [""] * field.size)
+            self.__rows[key] = cached
+        _, revisions, cells, texts = cached
+        changed = []
+        for x in range(1, field.size + 1):
+            revision = field.row_revision(x)
+            if revisions[x] != revision:
+                revisions[x] = revision
+                cells[x] = field.row(x, hidden)
+                texts[x] = str(x).ljust(self.label_width(field)) + "".join(f"{v:2s}" for v in cells[x])
+                changed.append(x)
+        return cells, texts, changed
+
+    def frame(self, boards, message=None):
+        """Текст кадра.
+        :param boards: список троек (заголовок, поле, hidden)
+        :param message: текст перед досками; в режиме ansi - под досками, чтобы не сдвигать их
+        """
+        message = message + "\n" if message else ""
+        rendered = [self.__cached_rows(field, hidden) for _, field, hidden in boards]
+        if len(self.__rows) > len(boards):
+            # Доски прошлых партий не держим: кэш не должен продлевать жизнь полям
+            drawn = {(id(field), hidden) for _, field, hidden in boards}
+            self.__rows = {key: cached for key, cached in self.__rows.items() if key in drawn}
+        if not self.ansi:
+            return message + self.__full_frame(boards, rendered)
+        layout = [(title, id(field), field.size, hidden) for title, field, hidden in boards]
+        if layout != self.__layout:
+            self.__layout = layout
+            self.__screen = [[list(row) if row else None for row in cells] for cells, _, _ in rendered]
+            return CSI + "H" + CSI + "2J" + self.__full_frame(boards, rendered) + message
+        return self.__diff_frame(boards, rendered) + message
+
+    def render(self, boards, message=None):
+        """Вывести кадр одной записью.
+        :param boards: список троек (заголовок, поле, hidden)
+        :param message: текст перед досками; в режиме ansi - под досками, чтобы не сдвигать их
+        """
+        stream = self.stream or sys.stdout
+        stream.write(self.frame(boards, message))
+        stream.flush()
+
+    @staticmethod
+    def __full_frame(boards, rendered):
+        lines = []
+        for (title, _, _), (_, texts, _) in zip(boards, rendered):
+            lines.append(title)
+            lines.extend(texts)
+        return "\n".join(lines) + "\n"
+
+    def __diff_frame(self, boards, rendered):
+        out = []
+        line = 1  # Строка экрана, считая с 1
+        for (_, field, _), (cells, _, changed), screen in zip(boards, rendered, self.__screen):
+            first_row_line = line + 2  # Заголовок доски и номера колонок
+            width = self.label_width(field)
+            for x in changed:
+                for y, (old, new) in enumerate(zip(screen[x], cells[x])):
+                    if old != new:
+                        out.append(f"{CSI}{first_row_line + x - 1};{width + 2 * y + 1}H{new}")
+                screen[x] = list(cells[x])
+            line = first_row_line + field.size
+        # Курсор - под доски, а то, что было выведено под ними после прошлого кадра, стираем
+        out.append(f"{CSI}{line};1H{CSI}J")
+        return "".join(out)
@@ -0,0 +1,194 @@
+"""Игровой сервер: много одновременных партий с компьютером по TCP на asyncio.
+
+Протокол строковый (UTF-8), по одной команде в строке:
+    NEW [корабли]  - новая партия; корабли задаются как в Field.read_player_field:
+                     "1,1 1,2 1,3; 4,2 4,3; 6,1 6,2; 1,5; 3,6; 6,4; 6,6", без них поле генерируется случайно
+    SHOT x y       - выстрел по полю компьютера: номер строки и столбца
+    QUIT           - закрыть соединение
+Ответ на каждую команду заканчивается строкой TURN (ваш ход), END (партия окончена) или ERR <причина>.
+Перед TURN/END сервер присылает результат выстрела игрока: MISS, HIT или KILL (и WIN, если это победа),
+а после промаха - ходы компьютера строками "AI x y MISS|HIT|KILL" (и LOSE, если компьютер выиграл).
+
+Запуск:
+    python server.py --port 8765
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from models_inner import SIZE, Dot, Field, FieldGenerator, SeaBattleException, ShootResult, default_fleet
+from models_outer import AI, GameEventKind, GameState
+
+
+LOGGER = logging.getLogger(__name__)
+
+RESULT_WORDS = {
+    ShootResult.missed: "MISS",
+    ShootResult.injure: "HIT",
+    ShootResult.killed: "KILL",
+}
+
+
+def generate_field(size, fleet):
+    """Случайное поле; функция уровня модуля, чтобы ее можно было выполнить в другом процессе."""
+    return FieldGenerator(size, fleet).generate_rnd_field()
+
+
+def generator_pool(workers):
+    """Пул процессов для generate_field. Процессы запускаются через spawn: пул создает их по первой задаче,
+    уже при открытых соединениях, и ответвленный процесс унаследовал бы сокеты клиентов - тогда после
+    закрытия соединения сервером клиент не получает конец потока."""
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+class GameSession:
+    """Партия одного клиента с компьютером поверх GameState: клиент - игрок 0 и ходит первым."""
+
+    def __init__(self, user_field, ai_field):
+        self.user_field = user_field
+        self.ai = AI(ai_field)
+        self.state = GameState(user_field, ai_field)
+
+    @property
+    def finished(self):
+        return self.state.finished
+
+    def user_shot(self, dot):
+        """Выстрел клиента и, если он промахнулся, ответные выстрелы компьютера.
+        :return: строки ответа без завершающей TURN/END
+        """
+        events = self.state.submit_shot(0, dot)
+        lines = [RESULT_WORDS[events[0].result]]
+        if events[-1].kind == GameEventKind.win:
+            lines.append("WIN")
+        elif events[-1].kind == GameEventKind.turn:
+            lines.extend(self.__ai_turn())
+        return lines
+
+    def __ai_turn(self):
+        lines = []
+        while self.state.turn == 1 and not self.state.finished:
+            dot = self.ai.next_shot()
+            events = self.state.submit_shot(1, dot)
+            res = events[0].result
+            self.ai.add_ai_shot(dot, res)
+            lines.append(f"AI {dot.x} {dot.y} {RESULT_WORDS[res]}")
+        if self.state.finished:
+            lines.append("LOSE")
+        return lines
+
+
+class GameServer:
+    def __init__(self, size=SIZE, fleet=None, executor=None):
+        """
+        :param size: размер полей
+        :param fleet: размеры кораблей; по умолчанию default_fleet(size)
+        :param executor: где генерировать поля, чтобы не занимать цикл событий;
+                         None - пул потоков цикла событий по умолчанию
+        """
+        self.size = size
+        self.fleet = tuple(fleet or default_fleet(size))
+        self.executor = executor
+        self.sessions = 0  # Текущие соединения
+        self.games = 0  # Начатые партии
+
+    async def generate_field(self):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, generate_field, self.size, self.fleet)
+
+    async def new_session(self, user_field=None):
+        """:param user_field: поле клиента; None - сгенерировать"""
+        if user_field is not None:
+            ai_field = await self.generate_field()
+        else:
+            user_field, ai_field = await asyncio.gather(self.generate_field(), self.generate_field())
+        self.games += 1
+        return GameSession(user_field, ai_field)
+
+    @staticmethod
+    def parse_arg(parse, *args):
+        """Разобрать аргументы команды; строку, которую не разобрать, - в SeaBattleException для ответа ERR."""
+        try:
+            return parse(*args)
+        except (ValueError, TypeError):
+            raise SeaBattleException("Ошибка парсинга координат.")
+
+    async def handle(self, reader, writer):
+        self.sessions += 1
+        session = None
+        try:
+            while True:
+                try:
+                    raw = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    # Строка длиннее лимита потока: остаток строки не дочитать, поэтому соединение закрываем
+                    writer.write("ERR Слишком длинная строка.\n".encode("utf-8"))
+                    await writer.drain()
+                    break
+                if not raw:
+                    break
+                command, _, arg = raw.decode("utf-8", "replace").strip().partition(" ")
+                command = command.upper()
+                if command == "QUIT":
+                    break
+                try:
+                    if command == "NEW":
+                        user_field = None
+                        if arg.strip():
+                            user_field = self.parse_arg(Field.parse_layout, arg.strip(), self.size, self.fleet)
+                        session = await self.new_session(user_field)
+                        lines = ["TURN"]
+                    elif command == "SHOT":
+                        if session is None or session.finished:
+                            raise SeaBattleException("Партия не начата.")
+                        dot = self.parse_arg(lambda s: Dot(*map(int, s.split())), arg)
+                        if session.ai.field.out(dot):
+                            raise SeaBattleException("Выстрел за пределы доски.")
+                        lines = session.user_shot(dot)
+                        lines.append("END" if session.finished else "TURN")
+                    else:
+                        raise SeaBattleException(f"Неизвестная команда: {command}")
+                except SeaBattleException as e:
+                    lines = [f"ERR {e.txt}"]
+                except Exception:
+                    # Ошибка сервера, а не клиента: клиенту - общий ответ, подробности - в журнал
+                    LOGGER.exception("Ошибка при выполнении команды %s", command)
+                    lines = ["ERR Внутренняя ошибка сервера."]
+                writer.write(("\n".join(lines) + "\n").encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port, limit=1 << 16)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Игровой сервер \"морского боя\".")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--size", type=int, default=SIZE, help="размер поля")
+    parser.add_argument(
+        "--generator-workers", type=int, default=0, metavar="K",
+        help="генерировать поля в K процессах (0 - в потоках сервера)",
+    )
+    args = parser.parse_args()
+    executor = generator_pool(args.generator_workers) if args.generator_workers else None
+    try:
+        asyncio.run(GameServer(args.size, executor=executor).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if executor:
+            executor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Пакетная симуляция партий компьютера против компьютера без ввода-вывода.
+
+Партии прогона нумеруются с 0, и k-я партия играется с seed game_seed(master_seed, k) в любом процессе,
+поэтому каждую из них можно повторить по (master_seed, k) через replay_game. С log_path все партии прогона
+дописываются в архив gamelog: процессы копят записи своих партий в памяти, а в файл их пишет главный процесс.
+С layouts_path доски берутся из таблицы layout_table: каждый процесс открывает ее через mmap сам,
+и страницы файла у процессов общие."""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from gamelog import GameLogBuffer, GameLogWriter
+from layout_table import open_layouts
+from models_inner import SIZE, game_seed, new_seed
+from models_outer import Game
+
+
+CHUNK_SIZE = 1000  # Кол-во партий в одной задаче для процесса
+
+
+class SimulationStats:
+    """Сводная статистика по сыгранным партиям. Статистики разных процессов складываются через merge."""
+
+    def __init__(self):
+        self.games = 0
+        self.first_wins = 0  # Победы игрока, который ходит первым
+        self.winner_shots = 0  # Суммарное кол-во выстрелов победителей
+        self.elapsed = 0.0  # Секунды
+        self.seed = None  # Главный seed прогона
+
+    def add(self, first_won, shots):
+        self.games += 1
+        self.first_wins += first_won
+        self.winner_shots += shots
+
+    def merge(self, other):
+        self.games += other.games
+        self.first_wins += other.first_wins
+        self.winner_shots += other.winner_shots
+
+    @property
+    def games_per_sec(self):
+        return self.games / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def mean_shots_to_win(self):
+        return self.winner_shots / self.games if self.games else 0.0
+
+    @property
+    def first_win_rate(self):
+        return self.first_wins / self.games if self.games else 0.0
+
+    @property
+    def second_win_rate(self):
+        return 1 - self.first_win_rate if self.games else 0.0
+
+    def __str__(self):
+        return (
+            f"Сыграно партий: {self.games} за {self.elapsed:.2f} с ({self.games_per_sec:.1f} партий/с), seed {self.seed}"
+            f"\nСреднее кол-во выстрелов победителя: {self.mean_shots_to_win:.2f}"
+            f"\nПобеды первого игрока: {self.first_win_rate:.2%}, второго: {self.second_win_rate:.2%}"
+        )
+
+
+def replay_game(master_seed, game_index, size=SIZE, log=None, layouts=None):
+    """Повторить партию game_index прогона simulate с главным seed master_seed.
+    :param log: дописать партию в этот архив: gamelog.GameLogWriter или GameLogBuffer
+    :param layouts: LayoutTable, если прогон шел с таблицей расстановок
+    :return: (True если победил первый игрок, кол-во выстрелов победителя)
+    """
+    return Game.play_headless(
+        size=size, log=log, seed=game_seed(master_seed, game_index), game=game_index, layouts=layouts,
+    )
+
+
+def play_games(first, games, size=SIZE, master_seed=0, log=None, layouts=None):
+    """Сыграть в текущем процессе партии с номерами от first до first + games на поле размером size."""
+    stats = SimulationStats()
+    for k in range(first, first + games):
+        stats.add(*replay_game(master_seed, k, size, log, layouts))
+    return stats
+
+
+def play_chunk(first, games, size, master_seed, log, layouts_path=None):
+    """Задача для процесса: статистика партий и, если log, их записи для архива (иначе None)."""
+    buffer = GameLogBuffer() if log else None
+    with open_layouts(layouts_path) as layouts:
+        stats = play_games(first, games, size, master_seed, buffer, layouts)
+    return stats, bytes(buffer.data) if log else None
+
+
+def simulate(games, workers=1, chunk_size=CHUNK_SIZE, size=SIZE, seed=None, log_path=None, layouts_path=None):
+    """Сыграть games партий, распределив их по workers процессам.
+    :param workers: кол-во процессов; 1 - играть в текущем процессе, 0 - по числу ядер
+    :param size: размер полей, флот - default_fleet(size)
+    :param seed: главный seed прогона; по умолчанию - из энтропии ОС
+    :param log_path: дописать все партии в этот архив (см. gamelog); с несколькими процессами партии идут
+                     в порядке готовности кусков, а не по номерам
+    :param layouts_path: брать доски из этой таблицы расстановок (см. layout_table); она должна быть построена
+                         для size и default_fleet(size)
+    """
+    started = time.perf_counter()
+    seed = new_seed() if seed is None else seed
+    workers = workers or os.cpu_count() or 1
+    log = GameLogWriter(log_path) if log_path else None
+    try:
+        if workers == 1:
+            with open_layouts(layouts_path) as layouts:
+                stats = play_games(0, games, size, seed, log, layouts)
+        else:
+            stats = SimulationStats()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(
+                        play_chunk, first, min(chunk_size, games - first), size, seed, bool(log), layouts_path,
+                    )
+                    for first in range(0, games, chunk_size)
+                ]
+                for future in as_completed(futures):
+                    chunk_stats, records = future.result()
+                    stats.merge(chunk_stats)
+                    if log:
+                        log.write(records)
+    finally:
+        if log:
+            log.close()
+    stats.seed = seed
+    stats.elapsed = time.perf_counter() - started
+    return stats
@@ -0,0 +1,62 @@
+"""Генерация полей сервера в пуле процессов: поля должны передаваться между процессами."""
+import asyncio
+import pickle
+import unittest
+
+from models_inner import Field, FieldGenerator
+from server import GameServer, generator_pool
+
+
+class FieldPickleTest(unittest.TestCase):
+    def test_default_field(self):
+        field = pickle.loads(pickle.dumps(Field()))
+        self.assertEqual(field.size, Field().size)
+        field.rnd_coords()
+
+    def test_generated_field(self):
+        field = FieldGenerator().generate_rnd_field()
+        self.assertEqual(pickle.loads(pickle.dumps(field)).board(), field.board())
+
+
+async def exchange(game_server, commands):
+    """Отправить команды серверу одним соединением и вернуть все строки ответа."""
+    server = await asyncio.start_server(game_server.handle, "127.0.0.1", 0)
+    async with server:
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(commands.encode("utf-8"))
+        await writer.drain()
+        lines = (await reader.read()).decode("utf-8").splitlines()
+        writer.close()
+        return lines
+
+
+class ProcessPoolServerTest(unittest.TestCase):
+    def test_new_with_generator_workers(self):
+        with generator_pool(1) as executor:
+            lines = asyncio.run(exchange(GameServer(executor=executor), "NEW\nSHOT 1 1\nQUIT\n"))
+        self.assertEqual(lines[0], "TURN")
+        self.assertIn(lines[-1], ("TURN", "END"))
+        self.assertFalse(any(line.startswith("ERR") for line in lines))
+
+
+class ServerErrorsTest(unittest.TestCase):
+    def test_bad_arguments(self):
+        lines = asyncio.run(exchange(GameServer(), "NEW 1,x\nNEW\nSHOT a b\nSHOT 1\nQUIT\n"))
+        parse_error = "ERR Ошибка парсинга координат."
+        self.assertEqual(lines, [parse_error, "TURN", parse_error, parse_error])
+
+    def test_internal_error(self):
+        game_server = GameServer()
+
+        async def broken_generator():
+            raise TypeError("generator failed")
+
+        game_server.generate_field = broken_generator
+        with self.assertLogs("server", "ERROR"):
+            lines = asyncio.run(exchange(game_server, "NEW\nQUIT\n"))
+        self.assertEqual(lines, ["ERR Внутренняя ошибка сервера."])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,316 @@
+"""Турнир компьютерных стратегий: каждая пара зарегистрированных стратегий (models_outer.STRATEGIES)
+играет на одних и тех же заранее сгенерированных раскладах.
+
+Расклад - пара досок. На каждом раскладе пара стратегий играет две партии: во второй стратегии меняются
+местами, поэтому каждая стреляет по обеим доскам и один раз ходит первой. Партии распределяются по процессам,
+а результаты дописываются в файл JSON Lines по мере готовности. Первая строка файла - настройки турнира
+и маски раскладов, остальные - по одной сыгранной партии. Если прогон прервать, то повторный запуск с тем же
+файлом доиграет только недостающие партии. Расклады и ходы стратегий берутся из главного seed турнира
+(game_seed), так что каждую партию можно повторить.
+
+Запуск:
+    python tournament.py results.jsonl --strategies simple density solver --deals 500
+    python tournament.py results.jsonl --report
+"""
+import argparse
+import collections
+import itertools
+import json
+import math
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from layout_table import layout_ships
+from models_inner import (
+    FieldGenerator, Field, SeaBattleException, Ship, ShipPart, SIZE, cell_bit, default_fleet, game_seed, new_seed,
+)
+from models_outer import STRATEGIES, Game, get_strategy
+
+
+CHUNK_SIZE = 20  # Партий в одной задаче для процесса
+Z = 1.96  # Квантиль нормального распределения для 95% доверительных интервалов
+
+
+def field_mask(field):
+    mask = 0
+    for ship in field.ships:
+        for p in ship.ship_parts:
+            mask |= cell_bit(p.x, p.y, field.size)
+    return mask
+
+
+def field_from_mask(mask, size, fleet):
+    field = Field(size=size, fleet=fleet)
+    for cells in layout_ships(mask, size):
+        field.add_ship(Ship(*[ShipPart(x, y) for x, y in cells]))
+    return field
+
+
+def generate_deals(count, size=SIZE, fleet=None, seed=None):
+    """count раскладов: пары масок досок."""
+    fgen = FieldGenerator(size, fleet or default_fleet(size), rng=random.Random(seed))
+    return [(field_mask(fgen.generate_rnd_field()), field_mask(fgen.generate_rnd_field())) for _ in range(count)]
+
+
+def schedule(strategies, deals):
+    """Все партии турнира по порядку номеров: (первый игрок, второй игрок, номер расклада).
+    Первый игрок получает первую доску расклада, а стреляет по второй."""
+    for a, b in itertools.combinations(strategies, 2):
+        for k in range(len(deals)):
+            yield a, b, k
+            yield b, a, k
+
+
+def play_matches(matches, deals, size, fleet, seed):
+    """Сыграть партии в текущем процессе; функция уровня модуля для пула процессов.
+    :param matches: список (номер партии, первый игрок, второй игрок, номер расклада)
+    :param deals: маски раскладов по номерам, только нужные этим партиям
+    :param seed: главный seed турнира
+    """
+    results = []
+    for game, first, second, k in matches:
+        fields = tuple(field_from_mask(mask, size, fleet) for mask in deals[k])
+        first_won, shots = Game.play_headless(first, second, fields=fields, seed=game_seed(seed, game))
+        results.append({
+            "game": game, "first": first, "second": second, "deal": k,
+            "winner": first if first_won else second, "shots": shots,
+        })
+    return results
+
+
+def read_results(path):
+    """Настройки и результаты из файла турнира. Недописанная при прерывании последняя строка пропускается.
+    :return: (настройки или None, если файла нет, список результатов)
+    """
+    if not os.path.exists(path):
+        return None, []
+    config = None
+    results = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if config is None:
+                config = record
+            else:
+                results.append(record)
+    return config, results
+
+
+def run(path, strategies=None, deals=0, size=None, workers=0, chunk_size=CHUNK_SIZE, progress=None, seed=None):
+    """Сыграть недостающие партии турнира, дописывая результаты в path.
+    Если файл уже есть, то стратегии и расклады берутся из него, а strategies, deals и size должны
+    совпадать с его настройками или не задаваться.
+    :param strategies: имена стратегий из STRATEGIES
+    :param deals: кол-во раскладов
+    :param size: размер поля, по умолчанию SIZE; флот - default_fleet(size)
+    :param workers: кол-во процессов; 1 - играть в текущем процессе, 0 - по числу ядер
+    :param progress: функция, которая получает (сыграно, всего) после каждой задачи
+    :param seed: главный seed нового турнира; по умолчанию - из энтропии ОС
+    :return: (настройки турнира, результаты всех сыгранных партий)
+    """
+    config, results = read_results(path)
+    if config is None:
+        size = size or SIZE
+        if not strategies or len(strategies) < 2 or deals <= 0:
+            raise SeaBattleException("Для нового турнира нужны хотя бы две стратегии и хотя бы один расклад.")
+        for name in strategies:
+            get_strategy(name)
+        fleet = default_fleet(size)
+        seed = new_seed() if seed is None else seed
+        config = {
+            "strategies": list(strategies), "size": size, "fleet": list(fleet), "seed": seed,
+            "deals": [list(deal) for deal in generate_deals(deals, size, fleet, seed)],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(config) + "\n")
+    elif (
+            strategies and list(strategies) != config["strategies"]
+            or deals and deals != len(config["deals"])
+            or size and size != config["size"]
+            or seed is not None and seed != config["seed"]
+    ):
+        raise SeaBattleException(f"Файл {path} - от турнира с другими настройками.")
+    else:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            cut = f.read(1) != b"\n"
+        if cut:
+            # Прогон прервали посреди записи: недописанную строку оставляем отдельной, read_results ее пропустит
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n")
+
+    size, fleet, all_deals = config["size"], tuple(config["fleet"]), config["deals"]
+    done = {(r["first"], r["second"], r["deal"]) for r in results}
+    todo = [(game, *m) for game, m in enumerate(schedule(config["strategies"], all_deals)) if m not in done]
+    total = len(done) + len(todo)
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+
+    def tasks():
+        for chunk in chunks:
+            yield chunk, {k: all_deals[k] for _, _, _, k in chunk}
+
+    with open(path, "a", encoding="utf-8") as out:
+        def save(chunk_results):
+            for r in chunk_results:
+                out.write(json.dumps(r, ensure_ascii=False) + "\n")
+            out.flush()
+            results.extend(chunk_results)
+            if progress:
+                progress(len(results), total)
+
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            for chunk, deals_part in tasks():
+                save(play_matches(chunk, deals_part, size, fleet, config["seed"]))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(play_matches, chunk, part, size, fleet, config["seed"]) for chunk, part in tasks()
+                ]
+                try:
+                    for future in as_completed(futures):
+                        save(future.result())
+                except BaseException:
+                    # Прерванный прогон: сохраненное уже в файле, остальное доиграет следующий запуск
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+    return config, results
+
+
+def wilson_interval(wins, games, z=Z):
+    """Доверительный интервал Уилсона для доли побед."""
+    if not games:
+        return 0.0, 1.0
+    p = wins / games
+    center = (p + z * z / (2 * games)) / (1 + z * z / games)
+    half = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def mean_interval(values, z=Z):
+    """Среднее и нормальный доверительный интервал для него."""
+    n = len(values)
+    if not n:
+        return 0.0, 0.0, 0.0
+    mean = sum(values) / n
+    if n == 1:
+        return mean, mean, mean
+    sd = math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1))
+    half = z * sd / math.sqrt(n)
+    return mean, mean - half, mean + half
+
+
+def quantile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))] if sorted_values else 0
+
+
+def summarize(strategies, results):
+    """Сводка турнира: по каждой стратегии и каждой паре.
+    :return: словарь, пригодный для json.dump
+    """
+    games = collections.Counter()
+    wins = collections.Counter()
+    shots = collections.defaultdict(list)  # Стратегия -> выстрелов в каждой выигранной партии
+    pair_games = collections.Counter()
+    pair_wins = collections.Counter()
+    for r in results:
+        winner = r["winner"]
+        loser = r["second"] if winner == r["first"] else r["first"]
+        for name in (winner, loser):
+            games[name] += 1
+        wins[winner] += 1
+        shots[winner].append(r["shots"])
+        pair_games[frozenset((winner, loser))] += 1
+        pair_wins[winner, loser] += 1
+
+    summary = {"strategies": {}, "pairs": []}
+    for name in strategies:
+        values = sorted(shots[name])
+        mean, low, high = mean_interval(values)
+        summary["strategies"][name] = {
+            "games": games[name],
+            "wins": wins[name],
+            "win_rate": wins[name] / games[name] if games[name] else 0.0,
+            "win_rate_ci": wilson_interval(wins[name], games[name]),
+            "shots_to_win": {
+                "mean": mean, "mean_ci": (low, high),
+                "p10": quantile(values, 0.1), "p50": quantile(values, 0.5), "p90": quantile(values, 0.9),
+                "distribution": sorted(collections.Counter(values).items()),
+            },
+        }
+    for a, b in itertools.combinations(strategies, 2):
+        n = pair_games[frozenset((a, b))]
+        summary["pairs"].append({
+            "first": a, "second": b, "games": n, "first_wins": pair_wins[a, b],
+            "first_win_rate": pair_wins[a, b] / n if n else 0.0,
+            "first_win_rate_ci": wilson_interval(pair_wins[a, b], n),
+        })
+    return summary
+
+
+def format_summary(summary):
+    lines = [f"{'стратегия':<12} {'партий':>7} {'побед':>8} {'95% ДИ':>15} {'выстрелов до победы':>21} {'95% ДИ':>15}"
+             f" {'p10/p50/p90':>12}"]
+    for name, s in summary["strategies"].items():
+        shots = s["shots_to_win"]
+        lines.append(
+            f"{name:<12} {s['games']:>7} {s['win_rate']:>8.1%} "
+            f"{s['win_rate_ci'][0]:>7.1%}-{s['win_rate_ci'][1]:<7.1%} {shots['mean']:>21.2f} "
+            f"{shots['mean_ci'][0]:>7.2f}-{shots['mean_ci'][1]:<7.2f} "
+            f"{shots['p10']:>4}/{shots['p50']}/{shots['p90']}"
+        )
+    lines.append("")
+    for p in summary["pairs"]:
+        low, high = p["first_win_rate_ci"]
+        lines.append(
+            f"{p['first']} против {p['second']}: {p['first_win_rate']:.1%} побед ({low:.1%}-{high:.1%}),"
+            f" партий {p['games']}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="файл результатов (JSON Lines); если он есть, турнир продолжается")
+    parser.add_argument(
+        "--strategies", nargs="+", metavar="NAME",
+        help=f"стратегии нового турнира: {', '.join(sorted(STRATEGIES))}",
+    )
+    parser.add_argument("--deals", type=int, default=0, help="кол-во раскладов нового турнира")
+    parser.add_argument("--size", type=int, help=f"размер поля нового турнира (по умолчанию {SIZE}); флот - default_fleet(size)")
+    parser.add_argument("--seed", type=int, help="главный seed нового турнира")
+    parser.add_argument("--workers", type=int, default=0, help="кол-во процессов (0 - по числу ядер)")
+    parser.add_argument("--report", action="store_true", help="только вывести сводку по уже сыгранным партиям")
+    parser.add_argument("--json", metavar="FILE", help="сохранить сводку в FILE (JSON)")
+    args = parser.parse_args()
+
+    try:
+        if args.report:
+            config, results = read_results(args.path)
+            if config is None:
+                raise SeaBattleException(f"Файла {args.path} нет.")
+        else:
+            def progress(played, total):
+                print(f"\rСыграно партий: {played} из {total}", end="", file=sys.stderr, flush=True)
+
+            config, results = run(
+                args.path, args.strategies, args.deals, args.size, args.workers, progress=progress, seed=args.seed,
+            )
+            print(file=sys.stderr)
+    except SeaBattleException as e:
+        sys.exit(str(e))
+
+    summary = summarize(config["strategies"], results)
+    print(format_summary(summary))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()